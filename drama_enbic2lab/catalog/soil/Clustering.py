@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+from drama.process import Process
+from drama.models.task import TaskResult
+
+from drama.core.model import SimpleTabularDataset
+
+from drama_enbic2lab.catalog.soil.utils import Reservoir, iter_table
+
+
+@dataclass
+class SimpleTabularDatasetCentroids(SimpleTabularDataset):
+    pass
+
+
+@dataclass
+class SimpleTabularDatasetSilhouette(SimpleTabularDataset):
+    pass
+
+
+def execute(
+    pcs: Process,
+    k_min: int = 2,
+    k_max: int = 8,
+    epochs: int = 3,
+    batch_size: int = 1024,
+    chunksize: int = 10000,
+    sample_size: int = 10000,
+    seed: int = None,
+):
+    """
+    Cluster the samples by their principal components with a mini-batch k-means for every number of clusters in a
+    range, keeping the one with the highest silhouette
+    Args:
+        pcs (Process)
+    Parameters:
+        k_min (int): Minimum number of clusters. Default to 2
+        k_max (int): Maximum number of clusters. Default to 8
+        epochs (int): Number of passes over the samples to fit the centroids. Default to 3
+        batch_size (int): Number of samples of every mini-batch. Default to 1024
+        chunksize (int): Number of rows read at a time. Default to 10000
+        sample_size (int): Number of random samples the silhouette is computed on. Default to 10000
+        seed (int): Seed of the centroids initialization and of the sample. Default to None
+
+    Inputs:
+         TabularDataSet (Simple Dataset): CSV with the principal components of the samples
+    Outputs:
+        TabularDataSet (Simple Dataset): CSV with the principal components and the cluster of every sample
+        SimpleTabularDatasetCentroids (Simple Dataset): CSV with the centroid and number of samples of every
+            cluster
+        SimpleTabularDatasetSilhouette (Simple Dataset): CSV with the silhouette and inertia of every number of
+            clusters
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_file = inputs["SimpleTabularDataset"][0]
+    input_file_resource = input_file["resource"]
+    input_file_delimiter = input_file["delimiter"]
+
+    local_file_path = pcs.storage.get_file(input_file_resource)
+
+    # checking errors
+    if not 2 <= k_min <= k_max:
+        raise ValueError("Enter a valid range of clusters, it must start at 2 at least")
+
+    if epochs < 1 or batch_size < 1 or chunksize < 1 or sample_size <= k_max:
+        raise ValueError("Enter a valid number of epochs, batch size, chunk size and sample size")
+
+    models = {
+        k: MiniBatchKMeans(n_clusters=k, batch_size=batch_size, random_state=None if seed is None else seed + k)
+        for k in range(k_min, k_max + 1)
+    }
+    reservoir = Reservoir(sample_size, seed)
+
+    # a first pass samples the rows, the centroids are initialized on the sample as the rows may be sorted
+    try:
+        for chunk in iter_table(local_file_path, input_file_delimiter, chunksize):
+            factors = chunk.columns.values.tolist()
+            reservoir.update(chunk.values.astype(np.float64))
+    except:
+        raise ValueError("The input file format is not correct")
+
+    sample = reservoir.sample
+    if len(sample) <= k_max:
+        raise ValueError("The dataset must have more samples than the maximum number of clusters")
+
+    for model in models.values():
+        model.partial_fit(sample)
+
+    # every pass over the chunks updates the centroids of all the models by mini-batches
+    for _ in range(epochs):
+        for chunk in iter_table(local_file_path, input_file_delimiter, chunksize):
+            values = chunk.values.astype(np.float64)
+            for start in range(0, len(values), batch_size):
+                for model in models.values():
+                    model.partial_fit(values[start : start + batch_size])
+
+    # silhouette of every model over the sample, the cost only depends on the sample size
+    scores = []
+    for k, model in models.items():
+        labels = model.predict(sample)
+        silhouette = silhouette_score(sample, labels) if len(np.unique(labels)) > 1 else -1.0
+        scores.append([k, silhouette, -model.score(sample)])
+
+    silhouette_df = pd.DataFrame(scores, columns=["Clusters", "Silhouette", "Inertia"])
+    best_k = int(silhouette_df.loc[silhouette_df["Silhouette"].idxmax(), "Clusters"])
+    best_model = models[best_k]
+
+    pcs.info([f"Best number of clusters {best_k} over {reservoir.seen} samples"])
+
+    # prepare output for the clusters of the samples
+    out_csv = Path(pcs.storage.local_dir, "Clusters.csv")
+    sizes = np.zeros(best_k, dtype=np.int64)
+
+    for number, chunk in enumerate(iter_table(local_file_path, input_file_delimiter, chunksize)):
+        labels = best_model.predict(chunk.values.astype(np.float64))
+        sizes += np.bincount(labels, minlength=best_k)
+
+        chunk["Cluster"] = labels
+        chunk.to_csv(
+            out_csv, sep=input_file_delimiter, index=False, mode="w" if number == 0 else "a", header=number == 0
+        )
+
+    # prepare output for the centroids
+    out_centroids = Path(pcs.storage.local_dir, "ClusterCentroids.csv")
+    centroids_df = pd.DataFrame(best_model.cluster_centers_, columns=factors)
+    centroids_df.insert(0, "Cluster", range(best_k))
+    centroids_df["Samples"] = sizes
+    centroids_df.to_csv(out_centroids, sep=input_file_delimiter, index=False)
+
+    # prepare output for the silhouette
+    out_silhouette = Path(pcs.storage.local_dir, "ClusterSilhouette.csv")
+    silhouette_df.to_csv(out_silhouette, sep=input_file_delimiter, index=False)
+
+    # send time to remote storage
+    dfs_dir_output = pcs.storage.put_file(out_csv)
+    dfs_dir_centroids = pcs.storage.put_file(out_centroids)
+    dfs_dir_silhouette = pcs.storage.put_file(out_silhouette)
+
+    # send to downstream
+    out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(out_csv)
+
+    out_centroids = SimpleTabularDatasetCentroids(
+        resource=dfs_dir_centroids, delimiter=input_file_delimiter, file_format=".csv"
+    )
+    pcs.to_downstream(out_centroids)
+
+    out_silhouette = SimpleTabularDatasetSilhouette(
+        resource=dfs_dir_silhouette, delimiter=input_file_delimiter, file_format=".csv"
+    )
+    pcs.to_downstream(out_silhouette)
+
+    return TaskResult(files=[dfs_dir_output, dfs_dir_centroids, dfs_dir_silhouette])
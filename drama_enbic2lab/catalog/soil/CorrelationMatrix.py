@@ -0,0 +1,161 @@
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from scipy.stats import rankdata
+
+from drama.process import Process
+from drama.models.task import TaskResult
+
+from drama.core.model import SimpleTabularDataset
+
+from drama_enbic2lab.catalog.soil.utils import CrossProducts, iter_table
+
+
+def _rank_columns(values: np.memmap):
+    """
+    Replace every column of `values` by its average ranks, null values are kept and not ranked.
+    """
+    for column in range(values.shape[1]):
+        data = np.array(values[:, column])
+        present = ~np.isnan(data)
+        data[present] = rankdata(data[present])
+        values[:, column] = data
+
+
+def _pairwise_spearman(ranks: np.memmap, correlation: np.ndarray) -> np.ndarray:
+    """
+    Replace the correlation of every pair of factors with null values by the Spearman coefficient over the rows
+    where both of them are present, ranking each pair over those rows.
+
+    The ranks of a subset of a column are those of its values, so the pairs are ranked from the column ranks.
+    """
+    incomplete = [column for column in range(ranks.shape[1]) if np.isnan(ranks[:, column]).any()]
+
+    for i in incomplete:
+        x = np.array(ranks[:, i])
+        for j in range(ranks.shape[1]):
+            y = x if j == i else np.array(ranks[:, j])
+            present = ~(np.isnan(x) | np.isnan(y))
+
+            with np.errstate(all="ignore"):
+                coefficient = np.corrcoef(rankdata(x[present]), rankdata(y[present]))[0, 1]
+
+            correlation[i, j] = correlation[j, i] = coefficient
+
+    return correlation
+
+
+def execute(
+    pcs: Process,
+    method: str = "pearson",
+    pairwise: bool = True,
+    dtype: str = "float64",
+    chunksize: int = 10000,
+):
+    """
+    Compute the correlation matrix of the numeric factors of a dataset, reading it by chunks so that the memory
+    only depends on the number of factors
+    Args:
+        pcs (Process)
+    Parameters:
+        method (str): Correlation coefficient, `pearson` or `spearman`. The ranks of the Spearman coefficient are
+            held in a temporary memory-mapped file. Default to pearson
+        pairwise (bool): Use the samples where both factors are present for every pair, otherwise the samples
+            with any null value are dropped. With `spearman`, every pair of factors with null values is ranked
+            over the samples where both are present. Default to True
+        dtype (str): Precision of the sums, `float64` or `float32`. Default to float64
+        chunksize (int): Number of rows read at a time. Default to 10000
+
+    Inputs:
+         TabularDataSet (Simple Dataset): CSV file
+    Outputs:
+        TabularDataSet (Simple Dataset): CSV with the correlation of every pair of factors
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_file = inputs["SimpleTabularDataset"][0]
+    input_file_resource = input_file["resource"]
+    input_file_delimiter = input_file["delimiter"]
+
+    local_file_path = pcs.storage.get_file(input_file_resource)
+
+    # checking errors
+    if method not in ["pearson", "spearman"]:
+        raise ValueError("Enter a valid method, values are 'pearson' and 'spearman'")
+
+    if dtype not in ["float64", "float32"]:
+        raise ValueError("Enter a valid dtype, values are 'float64' and 'float32'")
+
+    if chunksize < 1:
+        raise ValueError("Enter a valid chunk size, it must be a positive number of rows")
+
+    def chunks():
+        for chunk in iter_table(local_file_path, input_file_delimiter, chunksize):
+            values = chunk[factors].apply(pd.to_numeric, errors="coerce")
+            yield values if pairwise else values.dropna()
+
+    # the numeric factors of the first chunk
+    try:
+        first = next(iter_table(local_file_path, input_file_delimiter, chunksize))
+    except:
+        raise ValueError("The file input is not in the valid format")
+
+    factors = first.select_dtypes("number").columns.values.tolist()
+    if not factors:
+        raise ValueError("Enter a dataset with numeric factors")
+
+    cross_products = CrossProducts(len(factors), dtype, pairwise)
+
+    if method == "pearson":
+        for values in chunks():
+            cross_products.update(values.values)
+        rows = int(np.max(cross_products.count))
+        correlation = cross_products.correlation()
+    else:
+        # the ranks need every value of a factor, the data is copied by columns to a temporary memory-mapped file
+        rows = sum(len(values) for values in chunks())
+        with tempfile.TemporaryDirectory(dir=pcs.storage.local_dir) as ranks_dir:
+            ranks_path = Path(ranks_dir, "CorrelationRanks.dat")
+            ranks = np.memmap(ranks_path, dtype=np.float64, mode="w+", shape=(max(rows, 1), len(factors)), order="F")
+
+            start = 0
+            for values in chunks():
+                ranks[start : start + len(values)] = values.values
+                start += len(values)
+
+            _rank_columns(ranks[:rows])
+
+            for start in range(0, rows, chunksize):
+                cross_products.update(ranks[start : start + chunksize])
+
+            # the pairs of factors without null values keep the correlation of the column ranks
+            correlation = cross_products.correlation()
+            if pairwise:
+                correlation = _pairwise_spearman(ranks[:rows], correlation)
+
+            del ranks
+
+    pcs.info([f"Correlation of {len(factors)} factors over {rows} samples"])
+
+    # prepare output for the correlation matrix
+    out_csv = Path(pcs.storage.local_dir, "CorrelationMatrix.csv")
+    correlation_df = pd.DataFrame(correlation, index=pd.Index(factors, name="Factor"), columns=factors)
+    correlation_df.to_csv(out_csv, sep=input_file_delimiter)
+
+    # send time to remote storage
+    dfs_dir_output = pcs.storage.put_file(out_csv)
+
+    # send to downstream
+    out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(out_csv)
+
+    return TaskResult(files=[dfs_dir_output])
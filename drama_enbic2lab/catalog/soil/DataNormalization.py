@@ -1,3 +1,5 @@
+from dataclasses import dataclass
+from pathlib import Path
 import pandas as pd
 
 from matplotlib import *
@@ -7,18 +9,49 @@ from drama.process import Process
 from drama.models.task import TaskResult
 from drama.core.model import SimpleTabularDataset
 
+from drama_enbic2lab.catalog.soil.utils import RunningMoments, iter_table, read_table
 
-def execute(pcs: Process):
+
+@dataclass
+class SimpleTabularDatasetScaler(SimpleTabularDataset):
+    pass
+
+
+def normalize(df: pd.DataFrame) -> tuple:
+    """
+    Center and scale an in-memory dataset, returning it with the means and standard deviations of its factors.
+    """
+    # Factors in the output
+    factors = df.columns.values.tolist()
+
+    # Centering and scaling the data so that the means for each factor are 0 and the standard deviation are 1
+    scaler = StandardScaler()
+    scaled_data = scaler.fit_transform(df)
+
+    # Create output dataframe
+    scaled_df = pd.DataFrame(scaled_data, columns=factors)
+
+    return scaled_df, scaler.mean_, scaler.scale_
+
+
+def execute(pcs: Process, chunksize: int = None, dtype: str = "float64"):
     """
     Normalized a given data, each factor have mean 0 and standard deviation 1.
     Args:
         pcs (Process)
     Parameters:
+        chunksize (int): Number of rows read at a time, the means and standard deviations are computed in a first
+            pass over the file and the data is scaled in a second one. The whole file is read at once if it is not
+            given. Default to None
+        dtype (str): Precision of the normalized data, `float64` or `float32`. Default to float64
 
     Inputs:
          TabularDataSet (Simple Dataset): CSV file
+         SimpleTabularDatasetScaler (Simple Dataset): Optional CSV with the mean and standard deviation of every
+            factor, the data is scaled with them and not fitted
     Outputs:
         TabularDataSet (Simple Dataset): CSV with the data normalized
+        SimpleTabularDatasetScaler (Simple Dataset): CSV with the mean and standard deviation of every factor
 
     Produces:
 
@@ -35,30 +68,90 @@ def execute(pcs: Process):
 
     local_file_path = pcs.storage.get_file(input_file_resource)
 
-    # Creating the dataframe and dropping null values to avoid errors
-    try:
-        df = pd.read_csv(local_file_path, sep=input_file_delimiter).dropna()
-    except:
-        raise ValueError("The file input is not in the valid format")
-
-    # Factors in the output
-    factors = df.columns.values.tolist()
-
-    # Centering and scaling the data so that the means for each factor are 0 and the standard deviation are 1
-    scaled_data = StandardScaler().fit_transform(df)
+    # checking errors
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("Enter a valid chunk size, it must be a positive number of rows")
 
-    # Create output dataframe
-    scaled_df = pd.DataFrame(scaled_data, columns=factors)
+    if dtype not in ["float64", "float32"]:
+        raise ValueError("Enter a valid dtype, values are 'float64' and 'float32'")
 
     # prepare output for the time series output
     out_csv = Path(pcs.storage.local_dir, "DataNormalized.csv")
-    scaled_df.to_csv(out_csv, sep=input_file_delimiter, index=False)
+
+    # parameters of a previous fit, the data is only scaled with them
+    apply_only = "SimpleTabularDatasetScaler" in inputs
+
+    if apply_only:
+        scaler_file = inputs["SimpleTabularDatasetScaler"][0]
+        scaler_df = pd.read_csv(
+            pcs.storage.get_file(scaler_file["resource"]), sep=scaler_file["delimiter"], index_col="Factor"
+        )
+
+        factors = scaler_df.index.tolist()
+        mean = scaler_df["Mean"].values
+        scale = scaler_df["Std"].values
+
+    if apply_only or chunksize:
+        if not apply_only:
+            # first pass, means and standard deviations of the factors without null values
+            moments = RunningMoments()
+            try:
+                for chunk in iter_table(local_file_path, input_file_delimiter, chunksize):
+                    moments.update(chunk.dropna())
+            except:
+                raise ValueError("The file input is not in the valid format")
+
+            if moments.count == 0:
+                raise ValueError("Enter a dataset with at least one sample without null values")
+
+            factors = chunk.columns.values.tolist()
+            mean = moments.mean
+            scale = moments.scale
+
+        # second pass, centering and scaling every chunk
+        try:
+            chunks = iter_table(local_file_path, input_file_delimiter, chunksize or 10000)
+            for number, chunk in enumerate(chunks):
+                if not set(factors).issubset(chunk.columns):
+                    raise ValueError("Enter a dataset with the factors of the scaler parameters")
+
+                # the samples with null values in any column are dropped, as when the scaler is fitted
+                scaled_df = ((chunk.dropna()[factors] - mean) / scale).astype(dtype)
+                scaled_df.to_csv(
+                    out_csv, sep=input_file_delimiter, index=False, mode="w" if number == 0 else "a", header=number == 0
+                )
+        except ValueError:
+            raise
+        except:
+            raise ValueError("The file input is not in the valid format")
+    else:
+        # Creating the dataframe and dropping null values to avoid errors
+        try:
+            df = read_table(local_file_path, input_file_delimiter).dropna()
+        except:
+            raise ValueError("The file input is not in the valid format")
+
+        scaled_df, mean, scale = normalize(df)
+        scaled_df = scaled_df.astype(dtype)
+        factors = scaled_df.columns.values.tolist()
+
+        scaled_df.to_csv(out_csv, sep=input_file_delimiter, index=False)
+
+    # prepare output for the scaler parameters
+    out_scaler = Path(pcs.storage.local_dir, "ScalerParameters.csv")
+    pd.DataFrame({"Mean": mean, "Std": scale}, index=pd.Index(factors, name="Factor")).to_csv(
+        out_scaler, sep=input_file_delimiter
+    )
 
     # send time to remote storage
     dfs_dir_output = pcs.storage.put_file(out_csv)
+    dfs_dir_scaler = pcs.storage.put_file(out_scaler)
 
     # send to downstream
     out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=input_file_delimiter, file_format=".csv")
     pcs.to_downstream(out_csv)
 
-    return TaskResult(files=[dfs_dir_output])
+    out_scaler = SimpleTabularDatasetScaler(resource=dfs_dir_scaler, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(out_scaler)
+
+    return TaskResult(files=[dfs_dir_output, dfs_dir_scaler])
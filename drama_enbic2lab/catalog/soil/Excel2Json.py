@@ -1,14 +1,198 @@
+import gzip
+import io
+import json
 import os
+import shutil
+import tempfile
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import partial
+from itertools import repeat
 from pathlib import Path
+import geopandas as gpd
 import pandas as pd
+from PIL import Image, ImageOps
 
 from drama.core.model import TempFile
 from drama.process import Process
 from drama.models.task import TaskResult
 
+from drama_enbic2lab.catalog.soil.utils import MediaUploader, StemIndex, morton_order, parse_workbook
+
+
+@dataclass
+class MediaIndex(TempFile):
+    pass
+
+
+@dataclass
+class SoilGeoParquet(TempFile):
+    pass
+
+
+# extensions of the workbooks, photographs and spectral responses
+EXCEL_EXTENSIONS = (".xlsx", ".XLSX", ".xls", ".XLS")
+PHOTO_EXTENSIONS = (".jpg", ".JPG")
+SPECTRE_EXTENSIONS = (".asd", ".ASD")
+
+
+def _write_geoparquet(samples: pd.DataFrame, path, row_group_size: int, crs: str = None):
+    """
+    Write the samples as GeoParquet with a point geometry, sorted along a Z-order curve so that every row group
+    covers a compact region, whose bounding box is in the statistics of the coordinate columns.
+    """
+    if not {"X-Coordinates", "Y-Coordinates"}.issubset(samples.columns):
+        raise ValueError("Enter workbooks with the coordinates of the samples")
+
+    x = pd.to_numeric(samples["X-Coordinates"], errors="coerce")
+    y = pd.to_numeric(samples["Y-Coordinates"], errors="coerce")
+
+    samples = samples.assign(**{"X-Coordinates": x, "Y-Coordinates": y})
+
+    # mixed values of the workbooks are written as text
+    for column in samples.columns:
+        if samples[column].dtype == object and not column.endswith("Path"):
+            samples[column] = samples[column].map(lambda value: value if pd.isna(value) else str(value))
+
+    points = gpd.points_from_xy(x.fillna(0), y.fillna(0))
+    geometry = gpd.GeoSeries(points, index=samples.index).where(x.notna() & y.notna())
+
+    order = morton_order(x.values, y.values)
+    geo_samples = gpd.GeoDataFrame(samples, geometry=geometry, crs=crs).iloc[order]
+    geo_samples.to_parquet(path, index=False, row_group_size=row_group_size)
+
+
+def _render_previews(source, name: str, previews_dir: str, thumbnail_size: int, preview_size: int) -> tuple:
+    """
+    Write a preview and a thumbnail of a photograph, given by its path or content, that fit in squares of
+    `preview_size` and `thumbnail_size` pixels. Files that are not valid images have no previews.
+    """
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+            # JPEG photographs are decoded at the smallest scale larger than the preview
+            image.draft("RGB", (preview_size, preview_size))
+            preview = ImageOps.exif_transpose(image).convert("RGB")
+    except OSError:
+        return None, None
+
+    preview.thumbnail((preview_size, preview_size), Image.LANCZOS)
+    thumbnail = preview.copy()
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+
+    # every photograph gets its own directory, as photographs of different directories may share their name
+    output_dir = tempfile.mkdtemp(dir=previews_dir)
+    paths = []
+    for image, suffix in [(thumbnail, "thumbnail"), (preview, "preview")]:
+        path = str(Path(output_dir, f"{Path(name).stem}_{suffix}.jpg"))
+        image.save(path, "JPEG", quality=85, optimize=True)
+        paths.append(path)
+
+    return tuple(paths)
+
+
+def _rendered(future, position: int):
+    """
+    Path of a rendered preview, once its photograph has been rendered.
+    """
+    return future.result()[position]
+
+
+def _parse_workbooks(workbooks, photo_index: StemIndex, spectre_index: StemIndex, workers: int = 1):
+    """
+    Parse the workbooks, in a pool of `workers` processes if there are more than one, yielding the fragments
+    in the order of `workbooks`.
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(parse_workbook, workbooks, repeat(photo_index), repeat(spectre_index))
+    else:
+        for workbook in workbooks:
+            yield parse_workbook(workbook, photo_index, spectre_index)
+
+
+def _lagged(fragments):
+    """
+    Yield every fragment once the next one is available.
+    """
+    previous = None
+    for fragment in fragments:
+        if previous is not None:
+            yield previous
+        previous = fragment
+    if previous is not None:
+        yield previous
+
+
+def execute(
+    pcs: Process,
+    author: str = None,
+    group: str = None,
+    project: str = None,
+    workers: int = 1,
+    extract: bool = True,
+    upload_workers: int = 4,
+    output_format: str = "json",
+    compress: bool = False,
+    geoparquet: bool = False,
+    row_group_size: int = 10000,
+    crs: str = None,
+    thumbnails: bool = False,
+    thumbnail_size: int = 256,
+    preview_size: int = 1024,
+    thumbnail_workers: int = 2,
+):
+    """
+    Convert the sampling workbooks of a compressed file into a JSON file, linking the photographs and
+    spectral responses of every sample
+    Args:
+        pcs (Process)
+    Parameters:
+        author (str): Author of the samples.
+        group (str): Group of the samples.
+        project (str): Project of the samples.
+        workers (int): Number of processes that parse the workbooks. Default to 1
+        extract (bool): Extract the compressed file and upload all its media, otherwise the workbooks are read
+            from the compressed file and only the media they reference are uploaded. Default to True
+        upload_workers (int): Number of threads that upload the media while the workbooks are parsed. Default to 4
+        output_format (str): Format of the samples, a JSON array (`json`) or one JSON record per line written as
+            the workbooks are parsed (`ndjson`). Default to json
+        compress (bool): Compress the `ndjson` output with gzip. Default to False
+        geoparquet (bool): Also write the samples as GeoParquet with their point geometry, sorted along a
+            space-filling curve. Default to False
+        row_group_size (int): Number of samples of every row group of the GeoParquet file, the bounding box of
+            a row group is in the statistics of its coordinates. Default to 10000
+        crs (str): Coordinate reference system of the coordinates, e.g. `EPSG:25830`. Default to None
+        thumbnails (bool): Upload a thumbnail and a web preview of every photograph, linked in the
+            `Pictures Thumbnail Path` and `Pictures Preview Path` columns. Default to False
+        thumbnail_size (int): Maximum width and height of the thumbnails, in pixels. Default to 256
+        preview_size (int): Maximum width and height of the previews, in pixels. Default to 1024
+        thumbnail_workers (int): Number of processes that render the thumbnails and previews. Default to 2
+
+    Inputs:
+         TempFile (TempFile): Zip file with the workbooks, photographs (`.jpg`) and spectral responses (`.asd`)
+         MediaIndex (TempFile): Optional JSON file with the media uploaded by previous runs, by SHA-256 and name
+    Outputs:
+        TempFile (TempFile): JSON (or JSON Lines) file with the samples of all the workbooks
+        MediaIndex (TempFile): JSON file with the uploaded media, by SHA-256 and name
+        SoilGeoParquet (TempFile): GeoParquet file with the samples, only with `geoparquet`
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+    # checking errors
+    if output_format not in ["json", "ndjson"]:
+        raise ValueError("Enter a valid output format, values are 'json' and 'ndjson'")
+
+    if row_group_size < 1:
+        raise ValueError("Enter a valid row group size, it must be a positive number of samples")
+
+    if thumbnails and (thumbnail_size < 1 or preview_size < 1 or thumbnail_workers < 1):
+        raise ValueError("Enter a valid thumbnail size, preview size and number of thumbnail workers")
 
-def execute(pcs: Process, author: str = None, group: str = None, project: str = None):
     # read inputs
     inputs = pcs.get_from_upstream()
 
@@ -30,112 +214,205 @@ def execute(pcs: Process, author: str = None, group: str = None, project: str =
 
         return files, content_path
 
-    # extract `input_zip`
-    imput_files, input_dir = extract_all_content(zip_file=local_zip_path, dir="input")
-    pcs.debug([f"{len(imput_files)} input files @ {input_dir}"])
-
-    # get files with extension `.xlsx` `.jpg` `.asd`
-    files_excel_local = []
-    files_jpg = []
-    files_asd = []
-
-    for (dirpath, dirnames, filenames) in os.walk(pcs.storage.local_dir):
-        for f in filenames:
-            if f.endswith(".xlsx") or f.endswith(".XLSX") or f.endswith(".xls") or f.endswith(".XLS"):
-                files_excel_local.append(Path(dirpath, f))
-            if f.endswith(".jpg") or f.endswith(".JPG"):
-                files_jpg.append(pcs.storage.put_file(Path(dirpath, f)))
-            if f.endswith(".asd") or f.endswith(".ASD"):
-                files_asd.append(pcs.storage.put_file(Path(dirpath, f)))
-
-    if len(files_excel_local) < 1:
-        raise Exception(f"No found excel files")
-
-    print(f"Found {len(files_excel_local)} files with extension `.xlsx`: {files_excel_local}")
-
-    res_pd = pd.DataFrame()
-
-    for excel_path in files_excel_local:
-        column_photo_path = []
-        column_spectre_path = []
-
-        excel_data_fragment = pd.read_excel(excel_path, sheet_name="EJEMPLO")
-        excel_data_fragment.rename(
-            columns={
-                "CÓDIGO": "Code",
-                "DESCRIPCIÓN": "Description",
-                "COORDENADAS X": "X-Coordinates",
-                "COORDENADAS Y": "Y-Coordinates",
-                "ALTITUD": "Altitude",
-                "PENDIENTE": "Slope",
-                "GRAVAS": "Gravels",
-                "ARENAS MUY GRUESAS": "Very Coarse Sands",
-                "ARENAS GRUESAS": "Coarse Sands",
-                "ARENAS MEDIAS": "Medium Sands",
-                "ARENAS FINAS": "Fine Sands",
-                "ARENAS MUY FINAS": "Very Fine Sands",
-                "ARENAS TOTALES": "Total Sands",
-                "LIMOS GRUESOS": "Coarse Silts",
-                "LIMOS FINOS": "Fine Silts",
-                "LIMOS TOTALES": "Total Silts",
-                "ARCILLAS": "Clays",
-                "FACTOR K": "K Factor",
-                "DENSIDAD APARENTE": "Apparent Density",
-                "ESTABILIDAD DE AGREGADOS": "Aggregate Stability",
-                "PERMEABILIDAD": "Permeability",
-                "CAPACIDAD DE CAMPO": "Field Capacity",
-                "PUNTO DE MARCHITEZ PERMANENTE": "Permanent Wilting Point",
-                "HIDROFOBICIDAD": "Hydrofobicity",
-                "CARBONO ORGÁNICO": "Organic Carbon",
-                "FACTOR C": "C Factor",
-                "CONDUCTIVIDAD ELÉCTRICA": "Electric Conductivity",
-            },
-            inplace=True,
-        )
-
-        column_photo = excel_data_fragment["FOTOGRAFÍAS"].values
-        for row_photo in column_photo:
-            strings_with_substring = [
-                string for string in files_jpg if str(string).split("/")[-1].split(".")[0] in str(row_photo)
-            ]
-            if len(strings_with_substring) > 0:
-                column_photo_path.append(strings_with_substring)
-            else:
-                column_photo_path.append(None)
-
-        column_spectre = excel_data_fragment["RESPUESTA ESPECTRAL"].values
-        for row_spectre in column_spectre:
-            strings_with_substring = [
-                string for string in files_asd if (str(string).split("/")[-1]).split(".")[0] in str(row_spectre)
+    # media already in remote storage from previous runs
+    media_index = {}
+    if "MediaIndex" in inputs:
+        with open(pcs.storage.get_file(inputs["MediaIndex"][0]["resource"]), encoding="utf-8") as fin:
+            media_index = json.load(fin)
+
+    # uploads of the photographs and spectra, by the path they are linked with
+    uploads = {}
+
+    # uploads of the thumbnail and preview of the photographs, rendered in a pool of processes
+    previews = {}
+
+    # the resources of the media are released after the uploader waits for them, also on errors
+    with ExitStack() as stack, MediaUploader(pcs.storage, workers=upload_workers, index=media_index) as uploader:
+        if thumbnails:
+            render_pool = stack.enter_context(ProcessPoolExecutor(max_workers=thumbnail_workers))
+            previews_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=pcs.storage.local_dir))
+
+        def submit_previews(photo: str, source):
+            """
+            Render the thumbnail and preview of a photograph and upload them once they are written.
+            """
+            rendered = render_pool.submit(
+                _render_previews, source, Path(photo).name, previews_dir, thumbnail_size, preview_size
+            )
+            previews[photo] = [
+                uploader.submit(partial(_rendered, rendered, position), remove=True) for position in range(2)
             ]
-            if len(strings_with_substring) > 0:
-                column_spectre_path.append(strings_with_substring)
-            else:
-                column_spectre_path.append(None)
 
-        excel_data_fragment["Pictures Path"] = column_photo_path
-        excel_data_fragment["Spectral Response Path"] = column_spectre_path
-        res_pd = pd.concat([res_pd, excel_data_fragment], ignore_index=True)
-        res_pd.drop(columns=["FOTOGRAFÍAS", "RESPUESTA ESPECTRAL"], inplace=True)
+        if extract:
+            # extract `input_zip`
+            imput_files, input_dir = extract_all_content(zip_file=local_zip_path, dir="input")
+            pcs.debug([f"{len(imput_files)} input files @ {input_dir}"])
+
+            # get files with extension `.xlsx` `.jpg` `.asd`, the media are uploaded while the workbooks are parsed
+            files_excel_local = []
+            files_jpg = []
+            files_asd = []
+
+            for (dirpath, dirnames, filenames) in os.walk(pcs.storage.local_dir):
+                for f in filenames:
+                    if f.endswith(EXCEL_EXTENSIONS):
+                        files_excel_local.append(Path(dirpath, f))
+                    if f.endswith(PHOTO_EXTENSIONS):
+                        files_jpg.append(str(Path(dirpath, f)))
+                    if f.endswith(SPECTRE_EXTENSIONS):
+                        files_asd.append(str(Path(dirpath, f)))
+
+            for media_path in files_jpg + files_asd:
+                uploads[media_path] = uploader.submit(Path(media_path))
+
+            if thumbnails:
+                for media_path in files_jpg:
+                    submit_previews(media_path, media_path)
+
+            if len(files_excel_local) < 1:
+                raise Exception(f"No found excel files")
+
+            print(f"Found {len(files_excel_local)} files with extension `.xlsx`: {files_excel_local}")
+
+            # parse the workbooks in parallel, the fragments are merged once in the order of the paths
+            files_excel_local = sorted(files_excel_local)
+
+            # index the photographs and spectra by stem once for all the workbooks
+            photo_index = StemIndex(files_jpg)
+            spectre_index = StemIndex(files_asd)
+
+            fragments = _parse_workbooks(files_excel_local, photo_index, spectre_index, workers)
+        else:
+            # read the workbooks from the members of `input_zip`, only the referenced media are uploaded
+            zip_obj = stack.enter_context(zipfile.ZipFile(local_zip_path))
+            media_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=pcs.storage.local_dir))
+
+            members = [member for member in zip_obj.namelist() if not member.endswith("/")]
+            pcs.debug([f"{len(members)} input files @ {local_zip_path}"])
+
+            files_excel_members = sorted(member for member in members if member.endswith(EXCEL_EXTENSIONS))
+
+            if len(files_excel_members) < 1:
+                raise Exception(f"No found excel files")
+
+            print(f"Found {len(files_excel_members)} files with extension `.xlsx`: {files_excel_members}")
+
+            photo_index = StemIndex([member for member in members if member.endswith(PHOTO_EXTENSIONS)])
+            spectre_index = StemIndex([member for member in members if member.endswith(SPECTRE_EXTENSIONS)])
+
+            def extract_member(member: str) -> Path:
+                """
+                Write a member of `input_zip` to its own temporary directory, keeping its file name.
+                """
+                member_path = Path(tempfile.mkdtemp(dir=media_dir), member.split("/")[-1])
+                with zip_obj.open(member) as fin, open(member_path, "wb") as fout:
+                    shutil.copyfileobj(fin, fout)
+                return member_path
+
+            def submit_media(fragments):
+                """
+                Upload the media referenced by every fragment as soon as it is parsed.
+                """
+                for fragment in fragments:
+                    for linked in pd.concat([fragment["Pictures Path"], fragment["Spectral Response Path"]]).dropna():
+                        for member in linked:
+                            if member not in uploads:
+                                uploads[member] = uploader.submit(partial(extract_member, member), remove=True)
+                    if thumbnails:
+                        for linked in fragment["Pictures Path"].dropna():
+                            for member in linked:
+                                if member not in previews:
+                                    submit_previews(member, zip_obj.read(member))
+                    yield fragment
+
+            workbooks = (io.BytesIO(zip_obj.read(member)) for member in files_excel_members)
+            fragments = submit_media(_parse_workbooks(workbooks, photo_index, spectre_index, workers))
 
-        res_pd["Author"] = author
-        res_pd["Group"] = group
-        res_pd["Project"] = project
+        def link_media(fragment: pd.DataFrame) -> pd.DataFrame:
+            """
+            Replace the media of a fragment by their remote paths and add the metadata of the samples.
+            """
+            if thumbnails:
+                for column, position in [("Pictures Thumbnail Path", 0), ("Pictures Preview Path", 1)]:
+                    fragment[column] = [
+                        None if linked is None else [previews[path][position].result() for path in linked]
+                        for linked in fragment["Pictures Path"]
+                    ]
 
-    # creates `out.json`
-    out_path = Path(pcs.storage.local_dir, "out.json")
-    with open(out_path, "w", encoding="utf-8") as file:
-        res_pd.to_json(file, orient="records", indent=3, force_ascii=False)
+            for column in ["Pictures Path", "Spectral Response Path"]:
+                fragment[column] = [
+                    None if linked is None else [uploads[path].result() for path in linked]
+                    for linked in fragment[column]
+                ]
+
+            fragment["Author"] = author
+            fragment["Group"] = group
+            fragment["Project"] = project
+
+            return fragment
+
+        # every fragment is linked once the next one is parsed, so that its media are uploaded meanwhile
+        if output_format == "ndjson":
+            out_path = Path(pcs.storage.local_dir, "out.ndjson.gz" if compress else "out.ndjson")
+
+            # the GeoParquet file is sorted, so its samples are kept
+            linked_fragments = []
+
+            with (gzip.open if compress else open)(out_path, "wt", encoding="utf-8") as file:
+                for fragment in _lagged(fragments):
+                    records = link_media(fragment).to_json(orient="records", lines=True, force_ascii=False)
+                    if records:
+                        file.write(records if records.endswith("\n") else records + "\n")
+                    if geoparquet:
+                        linked_fragments.append(fragment)
+
+            if geoparquet:
+                res_pd = pd.concat(linked_fragments, ignore_index=True)
+        else:
+            out_path = Path(pcs.storage.local_dir, "out.json")
+
+            res_pd = pd.concat([link_media(fragment) for fragment in _lagged(fragments)], ignore_index=True)
+
+            with open(out_path, "w", encoding="utf-8") as file:
+                res_pd.to_json(file, orient="records", indent=3, force_ascii=False)
+
+    pcs.debug([f"Uploaded {uploader.uploaded} of {len(uploads)} media files, the rest were already in storage"])
 
     if not out_path.is_file():
-        raise FileNotFoundError(f"`out.json` is missing")
+        raise FileNotFoundError(f"`{out_path.name}` is missing")
 
     # send to remote storage
     dfs_dir = pcs.storage.put_file(out_path)
     pcs.info([f"Created file {out_path}"])
 
+    # creates `MediaIndex.json`
+    media_index_path = Path(pcs.storage.local_dir, "MediaIndex.json")
+    with open(media_index_path, "w", encoding="utf-8") as file:
+        json.dump(uploader.index, file, indent=3)
+
+    # send to remote storage
+    media_index_dir = pcs.storage.put_file(media_index_path)
+
     # send to downstream
     output_json = TempFile(resource=dfs_dir)
     pcs.to_downstream(output_json)
 
-    return TaskResult(files=[dfs_dir])
+    output_media_index = MediaIndex(resource=media_index_dir)
+    pcs.to_downstream(output_media_index)
+
+    files = [dfs_dir, media_index_dir]
+
+    if geoparquet:
+        # creates `out.parquet`
+        geoparquet_path = Path(pcs.storage.local_dir, "out.parquet")
+        _write_geoparquet(res_pd, geoparquet_path, row_group_size, crs)
+
+        # send to remote storage
+        geoparquet_dir = pcs.storage.put_file(geoparquet_path)
+        files.append(geoparquet_dir)
+
+        # send to downstream
+        output_geoparquet = SoilGeoParquet(resource=geoparquet_dir)
+        pcs.to_downstream(output_geoparquet)
+
+    return TaskResult(files=files)
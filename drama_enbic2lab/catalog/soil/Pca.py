@@ -1,15 +1,30 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
 from matplotlib import *
 
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 
 from drama.process import Process
 from drama.models.task import TaskResult
 
-from drama.core.model import SimpleTabularDataset
+from drama.core.model import SimpleTabularDataset, TempFile
+
+from drama_enbic2lab.catalog.soil.utils import iter_table, read_table
+
+
+@dataclass
+class PcaModel(TempFile):
+    pass
+
+
+@dataclass
+class SimpleTabularDatasetBootstrap(SimpleTabularDataset):
+    pass
 
 
 def _dimension_reduction(percentage_variance: list, variance_explained: int):
@@ -21,7 +36,176 @@ def _dimension_reduction(percentage_variance: list, variance_explained: int):
     return n_components
 
 
-def execute(pcs: Process, variance_explained: int = 75, whiten: bool = True, number_components: int = 0):
+def _grow_components(df: pd.DataFrame, variance_explained: int, whiten: bool, seed: int = None) -> PCA:
+    """
+    Fit a randomized PCA doubling its number of components until they explain `variance_explained`, the full
+    decomposition is used once the components needed are close to the rank of the data.
+    """
+    limit = min(df.shape)
+    n_components = min(8, limit)
+
+    while n_components < limit:
+        pca = PCA(n_components=n_components, svd_solver="randomized", whiten=whiten, random_state=seed).fit(df)
+
+        per_var = np.round(pca.explained_variance_ratio_ * 100, decimals=1)
+        if np.cumsum(per_var)[-1] >= variance_explained:
+            return pca
+
+        n_components *= 2
+
+    return PCA(whiten=whiten).fit(df)
+
+
+# normalized data shared with the bootstrap workers, set once per process by the pool initializer
+_BOOTSTRAP_VALUES = None
+
+
+def _init_bootstrap(values: np.ndarray):
+    global _BOOTSTRAP_VALUES
+    _BOOTSTRAP_VALUES = values
+
+
+def _bootstrap_batch(seed_sequence: np.random.SeedSequence, replicates: int, reference: np.ndarray) -> tuple:
+    """
+    Explained variance ratios and loadings of `replicates` resamples of the rows of the shared data, from the
+    eigendecomposition of their covariance matrix, with every loading vector turned to the side of `reference`.
+    """
+    values = _BOOTSTRAP_VALUES
+    rng = np.random.default_rng(seed_sequence)
+    n_rows, n_components = len(values), len(reference)
+
+    ratios = np.empty((replicates, n_components))
+    loadings = np.empty((replicates,) + reference.shape)
+
+    for replicate in range(replicates):
+        sample = values[rng.integers(0, n_rows, n_rows)]
+        sample = sample - sample.mean(axis=0)
+
+        eigenvalues, eigenvectors = np.linalg.eigh(sample.T @ sample)
+        order = np.argsort(eigenvalues)[::-1][:n_components]
+
+        components = eigenvectors[:, order].T
+        signs = np.where(np.sum(components * reference, axis=1) < 0, -1.0, 1.0)
+
+        ratios[replicate] = eigenvalues[order] / eigenvalues.sum()
+        loadings[replicate] = components * signs[:, None]
+
+    return ratios, loadings
+
+
+def _bootstrap(values: np.ndarray, reference: np.ndarray, replicates: int, workers: int = 1, seed: int = None):
+    """
+    Bootstrap distributions of the explained variance ratios and loadings of the PCA of `values`, computed by
+    batches of 50 resamples with their own seeds, so that they do not depend on the number of `workers`.
+    """
+    sizes = [len(batch) for batch in np.array_split(np.arange(replicates), -(-replicates // 50))]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_bootstrap, initargs=(values,)) as executor:
+            batches = list(executor.map(_bootstrap_batch, seeds, sizes, repeat(reference)))
+    else:
+        _init_bootstrap(values)
+        batches = [_bootstrap_batch(seed_sequence, size, reference) for seed_sequence, size in zip(seeds, sizes)]
+
+    return np.concatenate([ratios for ratios, _ in batches]), np.concatenate([loadings for _, loadings in batches])
+
+
+def fit_pca(
+    df: pd.DataFrame,
+    variance_explained: int = 75,
+    whiten: bool = True,
+    number_components: int = 0,
+    svd_solver: str = "full",
+    seed: int = None,
+) -> PCA:
+    """
+    Fit a PCA on an in-memory dataset with the given decomposition.
+    """
+    if svd_solver == "auto":
+        svd_solver = "randomized" if max(df.shape) > 500 else "full"
+
+    if svd_solver == "full":
+        # Create PCA object
+        if number_components == 0:
+            pca = PCA(whiten=whiten)
+        # PCA object if a number of components is set
+        else:
+            pca = PCA(n_components=number_components, whiten=whiten)
+
+        # Fitting and transforming the data
+        return pca.fit(df)
+
+    # only the components needed are computed by the randomized decomposition
+    if number_components == 0:
+        return _grow_components(df, variance_explained, whiten, seed)
+
+    return PCA(n_components=number_components, svd_solver="randomized", whiten=whiten, random_state=seed).fit(df)
+
+
+def pca_model(pca, factors: list, variance_explained: int = 75, whiten: bool = True, number_components: int = 0):
+    """
+    Arrays of the components of a fitted PCA kept after the dimension reduction.
+    """
+    # Calculating the percentage of variation that each principal component accounts for
+    per_var = np.round(pca.explained_variance_ratio_ * 100, decimals=1)
+
+    # If the number of components is not specified we calculate it according to the explained variance
+    if number_components == 0:
+        number_components = _dimension_reduction(per_var, variance_explained)
+
+    return {
+        "factors": np.array(factors, dtype=str),
+        "mean": pca.mean_,
+        "components": pca.components_[:number_components],
+        "explained_variance": pca.explained_variance_[:number_components],
+        "explained_variance_ratio": pca.explained_variance_ratio_[:number_components],
+        "whiten": np.array(whiten),
+    }
+
+
+def _project(values: np.ndarray, model: dict) -> np.ndarray:
+    """
+    Principal components of the rows of `values` with the arrays of a PCA model, as `PCA.transform` does.
+    """
+    scores = (values - model["mean"]) @ model["components"].T
+    if model["whiten"]:
+        scores /= np.sqrt(model["explained_variance"])
+    return scores
+
+
+def _hold_back_short(chunks, number_components: int = 0):
+    """
+    Yield the chunks of a dataset merging the last one with the previous chunk if it has less rows, as every
+    partial fit of an incremental PCA needs at least as many rows as components.
+    """
+    previous = None
+    for chunk in chunks:
+        if previous is not None and len(chunk) < len(previous):
+            previous = pd.concat([previous, chunk])
+            continue
+        if previous is not None:
+            yield previous
+        if len(chunk) < (number_components or chunk.shape[1]):
+            raise ValueError("Enter a valid chunk size, it must be at least the number of components or factors")
+        previous = chunk
+
+    if previous is not None:
+        yield previous
+
+
+def execute(
+    pcs: Process,
+    variance_explained: int = 75,
+    whiten: bool = True,
+    number_components: int = 0,
+    svd_solver: str = "full",
+    seed: int = None,
+    chunksize: int = None,
+    bootstrap: int = 0,
+    confidence: float = 0.95,
+    workers: int = 1,
+):
     """
     Perform a Principal Component Analysis and Dimension Reduction
     Args:
@@ -34,11 +218,27 @@ def execute(pcs: Process, variance_explained: int = 75, whiten: bool = True, num
             Default to True
         number_components(int): Number of components desired after the dimension reduction.
             Default to 0 (Not to use this parameter)
+        svd_solver(str): Decomposition used, `full` computes every component while `randomized` only computes the
+            components needed, growing them until they explain `variance_explained`. `auto` uses `randomized`
+            for data with more than 500 rows or columns. Default to full
+        seed(int): Seed of the randomized decomposition. Default to None
+        chunksize(int): Number of rows read at a time, an incremental PCA is fitted over the chunks of the data and
+            the principal components are written in a second pass. The whole file is read at once if it is not
+            given and then `svd_solver` is used. Default to None
+        bootstrap(int): Number of resamples of the rows used to compute confidence intervals of the explained
+            variance ratios and loadings, only when the whole file is read. Default to 0 (No intervals)
+        confidence(float): Confidence level of the percentile intervals. Default to 0.95
+        workers(int): Number of processes that compute the resamples. Default to 1
 
     Inputs:
          TabularDataSet (Simple Dataset): CSV file
+         PcaModel (TempFile): Optional NumPy file with a PCA model, the data is projected on its components and
+            no PCA is fitted
     Outputs:
         TabularDataSet (Simple Dataset): CSV with the data normalized
+        PcaModel (TempFile): NumPy file with the factors, mean, components and explained variance of the model
+        SimpleTabularDatasetBootstrap (Simple Dataset): CSV with the estimate and confidence interval of the
+            explained variance ratio and the loadings of every component, only with `bootstrap`
 
     Produces:
 
@@ -55,45 +255,142 @@ def execute(pcs: Process, variance_explained: int = 75, whiten: bool = True, num
 
     local_file_path = pcs.storage.get_file(input_file_resource)
 
-    # Creating the dataframe from the normalized data
-    try:
-        df = pd.read_csv(local_file_path, sep=input_file_delimiter)
-    except:
-        raise ValueError("The input file format is not correct")
+    # checking errors
+    if svd_solver not in ["full", "randomized", "auto"]:
+        raise ValueError("Enter a valid svd solver, values are 'full', 'randomized' and 'auto'")
 
-    # Create PCA object
-    if number_components == 0:
-        pca = PCA(whiten=whiten)
-    # PCA object if a number of components is set
-    else:
-        pca = PCA(n_components=number_components, whiten=whiten)
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("Enter a valid chunk size, it must be a positive number of rows")
 
-    # Fitting and transforming the data
-    pca.fit(df)
-    pca_data = pca.transform(df)
+    if bootstrap and (chunksize or "PcaModel" in inputs):
+        raise ValueError("The bootstrap is only available when the whole file is read and a PCA is fitted")
 
-    # Calculating the percentage of variation that each principal component accounts for
-    per_var = np.round(pca.explained_variance_ratio_ * 100, decimals=1)
+    if not 0 < confidence < 1:
+        raise ValueError("Enter a valid confidence, it must be between 0 and 1")
 
-    # If the number of components is not specified we calculate it according to the explained variance
-    if number_components == 0:
-        number_components = _dimension_reduction(per_var, variance_explained)
+    # model of a previous fit, the data is only projected on its components
+    projection_only = "PcaModel" in inputs
 
-    pca_data = pca_data[:, :number_components]
+    if projection_only:
+        with np.load(pcs.storage.get_file(inputs["PcaModel"][0]["resource"])) as model_file:
+            model = dict(model_file)
 
-    pc_labels = ["PC" + str(x) for x in range(1, number_components + 1)]
+        factors = model["factors"].tolist()
+        number_components = len(model["components"])
+    elif chunksize:
+        # the components are fitted incrementally over the chunks of the normalized data
+        pca = IncrementalPCA(n_components=number_components or None, whiten=whiten)
+
+        try:
+            for chunk in _hold_back_short(
+                iter_table(local_file_path, input_file_delimiter, chunksize), number_components
+            ):
+                pca.partial_fit(chunk)
+                factors = chunk.columns.tolist()
+        except ValueError:
+            raise
+        except:
+            raise ValueError("The input file format is not correct")
+    else:
+        # Creating the dataframe from the normalized data
+        try:
+            df = read_table(local_file_path, input_file_delimiter)
+        except:
+            raise ValueError("The input file format is not correct")
+
+        pca = fit_pca(df, variance_explained, whiten, number_components, svd_solver, seed)
+        pca_data = pca.transform(df)
+        factors = df.columns.tolist()
 
-    pca_df = pd.DataFrame(data=pca_data, columns=pc_labels)
+    if not projection_only:
+        model = pca_model(pca, factors, variance_explained, whiten, number_components)
+        number_components = len(model["components"])
+
+    pc_labels = ["PC" + str(x) for x in range(1, number_components + 1)]
 
     # prepare output for the time series output
     out_csv = Path(pcs.storage.local_dir, "PCA.csv")
-    pca_df.to_csv(out_csv, sep=input_file_delimiter, index=False)
+
+    if projection_only or chunksize:
+        # second pass, projecting every chunk of the normalized data
+        for number, chunk in enumerate(iter_table(local_file_path, input_file_delimiter, chunksize or 10000)):
+            if not set(factors).issubset(chunk.columns):
+                raise ValueError("Enter a dataset with the factors of the PCA model")
+
+            pca_df = pd.DataFrame(data=_project(chunk[factors].values, model), columns=pc_labels)
+            pca_df.to_csv(
+                out_csv, sep=input_file_delimiter, index=False, mode="w" if number == 0 else "a", header=number == 0
+            )
+    else:
+        pca_data = pca_data[:, :number_components]
+
+        pca_df = pd.DataFrame(data=pca_data, columns=pc_labels)
+
+        pca_df.to_csv(out_csv, sep=input_file_delimiter, index=False)
+
+    # prepare output for the PCA model
+    out_model = Path(pcs.storage.local_dir, "PCAModel.npz")
+    np.savez(out_model, **model)
 
     # send time to remote storage
     dfs_dir_output = pcs.storage.put_file(out_csv)
+    dfs_dir_model = pcs.storage.put_file(out_model)
+    files = [dfs_dir_output, dfs_dir_model]
+
+    if bootstrap:
+        ratios, loadings = _bootstrap(df.values, model["components"], bootstrap, workers, seed)
+        percentiles = [50 * (1 - confidence), 50 * (1 + confidence)]
+
+        pcs.info([f"Computed {bootstrap} bootstrap resamples of the PCA"])
+
+        ratio_lower, ratio_upper = np.percentile(ratios, percentiles, axis=0)
+        loading_lower, loading_upper = np.percentile(loadings, percentiles, axis=0)
+
+        rows = []
+        for component, label in enumerate(pc_labels):
+            rows.append(
+                [
+                    "Explained variance ratio",
+                    label,
+                    None,
+                    model["explained_variance_ratio"][component],
+                    ratio_lower[component],
+                    ratio_upper[component],
+                ]
+            )
+            for factor_number, factor in enumerate(factors):
+                rows.append(
+                    [
+                        "Loading",
+                        label,
+                        factor,
+                        model["components"][component, factor_number],
+                        loading_lower[component, factor_number],
+                        loading_upper[component, factor_number],
+                    ]
+                )
+
+        bootstrap_df = pd.DataFrame(rows, columns=["Statistic", "Component", "Factor", "Estimate", "Lower", "Upper"])
+
+        # prepare output for the confidence intervals
+        out_bootstrap = Path(pcs.storage.local_dir, "PCABootstrap.csv")
+        bootstrap_df.to_csv(out_bootstrap, sep=input_file_delimiter, index=False)
+
+        # send time to remote storage
+        dfs_dir_bootstrap = pcs.storage.put_file(out_bootstrap)
+        files.append(dfs_dir_bootstrap)
+
+        # send to downstream
+        out_bootstrap = SimpleTabularDatasetBootstrap(
+            resource=dfs_dir_bootstrap, delimiter=input_file_delimiter, file_format=".csv"
+        )
+        pcs.to_downstream(out_bootstrap)
 
     # send to downstream
     out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=input_file_delimiter, file_format=".csv")
     pcs.to_downstream(out_csv)
 
-    return TaskResult(files=[dfs_dir_output])
+    out_model = PcaModel(resource=dfs_dir_model)
+    pcs.to_downstream(out_model)
+
+    return TaskResult(files=files)
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from drama.process import Process
+from drama.models.task import TaskResult
+
+from drama.core.model import SimpleTabularDataset
+
+from drama_enbic2lab.catalog.soil.DataNormalization import SimpleTabularDatasetScaler, normalize
+from drama_enbic2lab.catalog.soil.Pca import PcaModel, fit_pca, pca_model
+from drama_enbic2lab.catalog.soil.SpssToCSV import read_spss
+
+
+@dataclass
+class SimpleTabularDatasetData(SimpleTabularDataset):
+    pass
+
+
+@dataclass
+class SimpleTabularDatasetNormalized(SimpleTabularDataset):
+    pass
+
+
+def execute(
+    pcs: Process,
+    drop_index: bool = True,
+    usecols: list = None,
+    variance_explained: int = 75,
+    whiten: bool = True,
+    number_components: int = 0,
+    svd_solver: str = "full",
+    seed: int = None,
+    persist_intermediates: bool = False,
+):
+    """
+    Convert a SPSS file, normalize its data and perform a Principal Component Analysis in a single step, as the
+    SpssToCSV, DataNormalization and Pca components do, without writing and reading the data between them
+    Args:
+        pcs (Process)
+    Parameters:
+        drop_index(bool): Drop index of tabular dataset. Default to True
+        usecols (list): Variables to convert, all of them if it is not given. Default to None
+        variance_explained(int): The total variace that is want it to be explained by the Principal Components.
+            Not needed if we set the number of components. Default to 75 %.
+        whiten(bool): Choose if the components are scaled to unit variance. Default to True
+        number_components(int): Number of components desired after the dimension reduction.
+            Default to 0 (Not to use this parameter)
+        svd_solver(str): Decomposition used by the PCA, `full`, `randomized` or `auto`. Default to full
+        seed(int): Seed of the randomized decomposition. Default to None
+        persist_intermediates(bool): Also write the converted and the normalized data. Default to False
+
+    Inputs:
+         TempFile (TempFile): SPSS file
+    Outputs:
+        TabularDataSet (Simple Dataset): CSV with the principal components of the samples
+        SimpleTabularDatasetScaler (Simple Dataset): CSV with the mean and standard deviation of every factor
+        PcaModel (TempFile): NumPy file with the factors, mean, components and explained variance of the model
+        SimpleTabularDatasetData (Simple Dataset): CSV with the converted data, only with `persist_intermediates`
+        SimpleTabularDatasetNormalized (Simple Dataset): CSV with the data normalized, only with
+            `persist_intermediates`
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_file = inputs["TempFile"][0]
+    input_file_resource = input_file["resource"]
+
+    local_file_path = pcs.storage.get_file(input_file_resource)
+
+    # checking errors
+    if svd_solver not in ["full", "randomized", "auto"]:
+        raise ValueError("Enter a valid svd solver, values are 'full', 'randomized' and 'auto'")
+
+    # Create the dataframe
+    try:
+        df = read_spss(local_file_path, usecols=usecols, drop_index=drop_index)
+    except:
+        raise ValueError("The format of the file is not valid")
+
+    # Centering and scaling the data dropping null values to avoid errors
+    scaled_df, mean, scale = normalize(df.dropna())
+    factors = scaled_df.columns.values.tolist()
+
+    pcs.info([f"Normalized {len(scaled_df)} samples of {len(factors)} factors"])
+
+    # Principal components
+    pca = fit_pca(scaled_df, variance_explained, whiten, number_components, svd_solver, seed)
+    model = pca_model(pca, factors, variance_explained, whiten, number_components)
+    number_components = len(model["components"])
+
+    pc_labels = ["PC" + str(x) for x in range(1, number_components + 1)]
+    pca_df = pd.DataFrame(data=pca.transform(scaled_df)[:, :number_components], columns=pc_labels)
+
+    # prepare the outputs
+    out_csv = Path(pcs.storage.local_dir, "PCA.csv")
+    pca_df.to_csv(out_csv, sep=";", index=False)
+
+    out_scaler = Path(pcs.storage.local_dir, "ScalerParameters.csv")
+    pd.DataFrame({"Mean": mean, "Std": scale}, index=pd.Index(factors, name="Factor")).to_csv(out_scaler, sep=";")
+
+    out_model = Path(pcs.storage.local_dir, "PCAModel.npz")
+    np.savez(out_model, **model)
+
+    # send time to remote storage
+    dfs_dir_output = pcs.storage.put_file(out_csv)
+    dfs_dir_scaler = pcs.storage.put_file(out_scaler)
+    dfs_dir_model = pcs.storage.put_file(out_model)
+    files = [dfs_dir_output, dfs_dir_scaler, dfs_dir_model]
+
+    # send to downstream
+    pcs.to_downstream(SimpleTabularDataset(resource=dfs_dir_output, delimiter=";", file_format=".csv"))
+    pcs.to_downstream(SimpleTabularDatasetScaler(resource=dfs_dir_scaler, delimiter=";", file_format=".csv"))
+    pcs.to_downstream(PcaModel(resource=dfs_dir_model))
+
+    if persist_intermediates:
+        # prepare the outputs of the converted and normalized data
+        out_data = Path(pcs.storage.local_dir, "Data.csv")
+        df.to_csv(out_data, sep=";", index=False)
+
+        out_normalized = Path(pcs.storage.local_dir, "DataNormalized.csv")
+        scaled_df.to_csv(out_normalized, sep=";", index=False)
+
+        # send time to remote storage
+        dfs_dir_data = pcs.storage.put_file(out_data)
+        dfs_dir_normalized = pcs.storage.put_file(out_normalized)
+        files += [dfs_dir_data, dfs_dir_normalized]
+
+        # send to downstream
+        pcs.to_downstream(SimpleTabularDatasetData(resource=dfs_dir_data, delimiter=";", file_format=".csv"))
+        pcs.to_downstream(
+            SimpleTabularDatasetNormalized(resource=dfs_dir_normalized, delimiter=";", file_format=".csv")
+        )
+
+    return TaskResult(files=files)
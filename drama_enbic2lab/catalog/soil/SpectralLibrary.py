@@ -0,0 +1,170 @@
+import io
+import struct
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from numpy.lib.format import open_memmap
+
+from drama.core.model import SimpleTabularDataset, TempFile
+from drama.process import Process
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.Excel2Json import EXCEL_EXTENSIONS, SPECTRE_EXTENSIONS
+from drama_enbic2lab.catalog.soil.utils import StemIndex, parse_workbook
+
+
+@dataclass
+class SpectralLibrary(TempFile):
+    pass
+
+
+@dataclass
+class SimpleTabularDatasetWavelengths(SimpleTabularDataset):
+    pass
+
+
+# layout of the binary files of the ASD spectroradiometers
+ASD_HEADER_SIZE = 484
+ASD_DATA_TYPE_OFFSET = 186
+ASD_WAVELENGTH_OFFSET = 191
+ASD_DATA_FORMAT_OFFSET = 199
+ASD_CHANNELS_OFFSET = 204
+
+# data types of the spectra, the raw ones are divided by their white reference
+ASD_RAW = 0
+ASD_FORMATS = {0: "<f4", 1: "<i4", 2: "<f8"}
+
+
+def read_asd(content: bytes, reflectance: bool = True) -> tuple:
+    """
+    Decode an ASD spectral response file, returning its wavelengths and values.
+
+    Raw spectra followed by a white reference, as written from the version 2 of the format on, are divided
+    by the reference when `reflectance` is set.
+    """
+    if len(content) < ASD_HEADER_SIZE or not content[:3].lower().startswith(b"as"):
+        raise ValueError("The file is not an ASD spectral response")
+
+    data_type = content[ASD_DATA_TYPE_OFFSET]
+    first_wavelength, wavelength_step = struct.unpack_from("<ff", content, ASD_WAVELENGTH_OFFSET)
+    data_format = content[ASD_DATA_FORMAT_OFFSET]
+    (channels,) = struct.unpack_from("<H", content, ASD_CHANNELS_OFFSET)
+
+    if data_format not in ASD_FORMATS:
+        raise ValueError(f"Unknown data format {data_format} of the ASD spectral response")
+
+    data_dtype = np.dtype(ASD_FORMATS[data_format])
+    data_end = ASD_HEADER_SIZE + channels * data_dtype.itemsize
+    values = np.frombuffer(content, dtype=data_dtype, count=channels, offset=ASD_HEADER_SIZE).astype(np.float64)
+
+    # the reference block starts with a flag, two times and a description prefixed by its length
+    if reflectance and data_type == ASD_RAW and len(content) > data_end + 20:
+        (description_length,) = struct.unpack_from("<H", content, data_end + 18)
+        reference_start = data_end + 20 + description_length
+
+        if len(content) >= reference_start + channels * data_dtype.itemsize:
+            reference = np.frombuffer(content, dtype=data_dtype, count=channels, offset=reference_start)
+            with np.errstate(all="ignore"):
+                values = values / reference
+
+    wavelengths = first_wavelength + wavelength_step * np.arange(channels)
+
+    return wavelengths, values
+
+
+def execute(pcs: Process, reflectance: bool = True):
+    """
+    Decode the ASD spectral responses of a compressed file into a single matrix of spectra, with an index of the
+    samples they belong to
+    Args:
+        pcs (Process)
+    Parameters:
+        reflectance (bool): Divide the raw spectra by their white reference. Default to True
+
+    Inputs:
+         TempFile (TempFile): Zip file with the workbooks and spectral responses (`.asd`), as for Excel2Json
+    Outputs:
+        SpectralLibrary (TempFile): NumPy file with a float32 matrix of the spectra by wavelength, it can be
+            memory-mapped to read any subset of spectra
+        TabularDataSet (Simple Dataset): CSV with the row, sample `Code` and file of every spectrum. The spectra
+            that no workbook references have no code
+        SimpleTabularDatasetWavelengths (Simple Dataset): CSV with the wavelength of every column of the matrix
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_zip = inputs["TempFile"][0]
+    input_zip_resource = input_zip["resource"]
+
+    local_zip_path = pcs.storage.get_file(input_zip_resource)
+
+    with zipfile.ZipFile(local_zip_path) as zip_obj:
+        members = [member for member in zip_obj.namelist() if not member.endswith("/")]
+        files_asd = sorted(member for member in members if member.endswith(SPECTRE_EXTENSIONS))
+
+        if len(files_asd) < 1:
+            raise Exception(f"No found spectral response files")
+
+        # code of the sample of every spectrum, as linked by the workbooks
+        spectre_index = StemIndex(files_asd)
+        codes = {}
+
+        for member in sorted(member for member in members if member.endswith(EXCEL_EXTENSIONS)):
+            fragment = parse_workbook(io.BytesIO(zip_obj.read(member)), StemIndex([]), spectre_index)
+            for code, linked in zip(fragment["Code"], fragment["Spectral Response Path"]):
+                for spectre in linked or []:
+                    codes.setdefault(spectre, code)
+
+        # the spectra are decoded one by one into the rows of the memory-mapped matrix
+        out_npy = Path(pcs.storage.local_dir, "SpectralLibrary.npy")
+        library = None
+
+        for row, member in enumerate(files_asd):
+            try:
+                member_wavelengths, values = read_asd(zip_obj.read(member), reflectance)
+            except (ValueError, struct.error):
+                raise ValueError(f"The spectral response {member} is not in the valid format")
+
+            if library is None:
+                wavelengths = member_wavelengths
+                library = open_memmap(out_npy, mode="w+", dtype=np.float32, shape=(len(files_asd), len(wavelengths)))
+            elif len(member_wavelengths) != len(wavelengths) or not np.allclose(member_wavelengths, wavelengths):
+                raise ValueError(f"The spectral response {member} has different wavelengths")
+
+            library[row] = values
+
+        library.flush()
+        del library
+
+    pcs.info([f"Decoded {len(files_asd)} spectral responses of {len(wavelengths)} wavelengths"])
+
+    # prepare output for the index and the wavelengths
+    out_index = Path(pcs.storage.local_dir, "SpectralIndex.csv")
+    index_df = pd.DataFrame(
+        {"Row": range(len(files_asd)), "Code": [codes.get(member) for member in files_asd], "File": files_asd}
+    )
+    index_df.to_csv(out_index, sep=";", index=False)
+
+    out_wavelengths = Path(pcs.storage.local_dir, "Wavelengths.csv")
+    pd.DataFrame({"Wavelength": wavelengths}).to_csv(out_wavelengths, sep=";", index=False)
+
+    # send time to remote storage
+    dfs_dir_library = pcs.storage.put_file(out_npy)
+    dfs_dir_index = pcs.storage.put_file(out_index)
+    dfs_dir_wavelengths = pcs.storage.put_file(out_wavelengths)
+
+    # send to downstream
+    pcs.to_downstream(SpectralLibrary(resource=dfs_dir_library))
+    pcs.to_downstream(SimpleTabularDataset(resource=dfs_dir_index, delimiter=";", file_format=".csv"))
+    pcs.to_downstream(SimpleTabularDatasetWavelengths(resource=dfs_dir_wavelengths, delimiter=";", file_format=".csv"))
+
+    return TaskResult(files=[dfs_dir_library, dfs_dir_index, dfs_dir_wavelengths])
@@ -0,0 +1,224 @@
+import zipfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from sklearn.utils.extmath import randomized_svd
+
+from drama.process import Process
+from drama.models.task import TaskResult
+
+from drama.core.model import SimpleTabularDataset
+
+from drama_enbic2lab.catalog.soil.Excel2Json import SPECTRE_EXTENSIONS
+from drama_enbic2lab.catalog.soil.SpectralLibrary import read_asd
+
+
+def _read_queries(path, reflectance: bool = True) -> tuple:
+    """
+    Read the query spectra and their names from a NumPy matrix, an ASD file or a zip file of ASD files.
+    """
+    path = str(path)
+    if path.endswith(".npy"):
+        queries = np.load(path)
+        return np.atleast_2d(queries), [str(row) for row in range(len(np.atleast_2d(queries)))]
+
+    if path.endswith(SPECTRE_EXTENSIONS):
+        with open(path, "rb") as fin:
+            return np.atleast_2d(read_asd(fin.read(), reflectance)[1]), [Path(path).name]
+
+    with zipfile.ZipFile(path) as zip_obj:
+        members = sorted(member for member in zip_obj.namelist() if member.endswith(SPECTRE_EXTENSIONS))
+        queries = [read_asd(zip_obj.read(member), reflectance)[1] for member in members]
+
+    return np.array(queries), members
+
+
+def _distances(queries: np.ndarray, spectra: np.ndarray, metric: str) -> np.ndarray:
+    """
+    Distances between every query and every spectrum, the cosine one is 1 minus the cosine similarity.
+
+    They are computed in double precision, as the dot products cancel out for the most similar spectra.
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+
+    if metric == "cosine":
+        # the queries are already normalized
+        norms = np.linalg.norm(spectra, axis=1)
+        return 1 - (queries @ spectra.T) / np.where(norms == 0, 1, norms)
+
+    squared = (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ spectra.T + (spectra ** 2).sum(axis=1)
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def _prepare(queries: np.ndarray, metric: str) -> np.ndarray:
+    queries = np.asarray(queries, dtype=np.float64)
+    if metric == "cosine":
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+    return queries
+
+
+def search(spectra, queries: np.ndarray, n_neighbors: int, metric: str = "cosine", block_size: int = 4096) -> tuple:
+    """
+    Rows and distances of the `n_neighbors` spectra nearest to every query, sorted by distance.
+
+    The spectra are read by blocks of `block_size` rows, so they can be a memory-mapped matrix, and only the
+    best rows found so far are kept for every query.
+    """
+    queries = _prepare(queries, metric)
+    n_neighbors = min(n_neighbors, len(spectra))
+
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_distances = np.empty((len(queries), 0), dtype=np.float64)
+
+    for start in range(0, len(spectra), block_size):
+        distances = _distances(queries, spectra[start : start + block_size], metric)
+        rows = np.broadcast_to(np.arange(start, start + distances.shape[1]), distances.shape)
+
+        best_rows = np.concatenate([best_rows, rows], axis=1)
+        best_distances = np.concatenate([best_distances, distances], axis=1)
+
+        if best_distances.shape[1] > n_neighbors:
+            kept = np.argpartition(best_distances, n_neighbors - 1, axis=1)[:, :n_neighbors]
+            best_rows = np.take_along_axis(best_rows, kept, axis=1)
+            best_distances = np.take_along_axis(best_distances, kept, axis=1)
+
+    order = np.argsort(best_distances, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_distances, order, axis=1)
+
+
+def _rerank(spectra, queries: np.ndarray, candidates: np.ndarray, n_neighbors: int, metric: str) -> tuple:
+    """
+    Exact distances of the candidate rows of every query, keeping the `n_neighbors` nearest ones.
+    """
+    queries = _prepare(queries, metric)
+
+    # every candidate spectrum is read once, in the order of the rows
+    rows = np.unique(candidates)
+    distances = _distances(queries, spectra[rows], metric)
+    distances = np.take_along_axis(distances, np.searchsorted(rows, candidates), axis=1)
+
+    order = np.argsort(distances, axis=1, kind="stable")[:, :n_neighbors]
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+def execute(
+    pcs: Process,
+    n_neighbors: int = 5,
+    metric: str = "cosine",
+    batch_size: int = 256,
+    block_size: int = 4096,
+    components: int = 0,
+    oversampling: int = 4,
+    sample_size: int = 10000,
+    reflectance: bool = True,
+    seed: int = None,
+):
+    """
+    Find the spectra of the spectral library most similar to every query spectrum
+    Args:
+        pcs (Process)
+    Parameters:
+        n_neighbors (int): Number of similar spectra of every query. Default to 5
+        metric (str): Distance between spectra, `cosine` or `euclidean`. Default to cosine
+        batch_size (int): Number of queries searched at a time. Default to 256
+        block_size (int): Number of spectra of the library read at a time. Default to 4096
+        components (int): Number of components of a randomized SVD of the library the candidates are searched
+            on, then the candidates are ranked by their exact distance. With `cosine`, the SVD is fitted on the
+            normalized spectra. Default to 0 (Not to reduce the spectra)
+        oversampling (int): Number of candidates of every query by neighbor when the spectra are reduced.
+            Default to 4
+        sample_size (int): Number of random spectra the SVD is fitted on. Default to 10000
+        reflectance (bool): Divide the raw ASD query spectra by their white reference. Default to True
+        seed (int): Seed of the sample and of the SVD. Default to None
+
+    Inputs:
+         SpectralLibrary (TempFile): NumPy file with the matrix of spectra, as written by SpectralLibrary
+         TempFile (TempFile): Query spectra, as a NumPy matrix (`.npy`), an ASD file or a zip file of ASD files
+         TabularDataSet (Simple Dataset): Optional CSV with the `Code` of every row of the library
+    Outputs:
+        TabularDataSet (Simple Dataset): CSV with the rank, row, code and distance of the neighbors of every query
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    library_file = pcs.storage.get_file(inputs["SpectralLibrary"][0]["resource"])
+    queries_file = pcs.storage.get_file(inputs["TempFile"][0]["resource"])
+
+    # checking errors
+    if metric not in ["cosine", "euclidean"]:
+        raise ValueError("Enter a valid metric, values are 'cosine' and 'euclidean'")
+
+    if n_neighbors < 1 or batch_size < 1 or block_size < 1 or components < 0 or oversampling < 1:
+        raise ValueError("Enter a valid number of neighbors, batch size, block size, components and oversampling")
+
+    spectra = np.load(library_file, mmap_mode="r")
+
+    try:
+        queries, names = _read_queries(queries_file, reflectance)
+    except:
+        raise ValueError("The query spectra are not in a valid format")
+
+    if queries.ndim != 2 or queries.shape[1] != spectra.shape[1]:
+        raise ValueError("Enter query spectra with the wavelengths of the spectral library")
+
+    codes = None
+    if "SimpleTabularDataset" in inputs:
+        index_file = inputs["SimpleTabularDataset"][0]
+        index_df = pd.read_csv(pcs.storage.get_file(index_file["resource"]), sep=index_file["delimiter"])
+        codes = index_df.set_index("Row")["Code"]
+
+    if components:
+        # the components are fitted on a random sample of the library, which is then reduced by blocks
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(spectra), min(sample_size, len(spectra)), replace=False))
+        sample = _prepare(spectra[sample], metric).astype(np.float32)
+
+        # the spectra are centered for the euclidean metric, while for the cosine one they are normalized and not
+        # centered, so that the euclidean distances between their projections follow their angles
+        mean = sample.mean(axis=0) if metric == "euclidean" else np.zeros(sample.shape[1], dtype=np.float32)
+        _, _, basis = randomized_svd(sample - mean, n_components=min(components, *sample.shape), random_state=seed)
+        basis = basis.T.astype(np.float32)
+
+        def reduce(values: np.ndarray) -> np.ndarray:
+            return (_prepare(values, metric).astype(np.float32) - mean) @ basis
+
+        reduced = np.concatenate(
+            [reduce(spectra[start : start + block_size]) for start in range(0, len(spectra), block_size)]
+        )
+        pcs.info([f"Reduced {len(spectra)} spectra to {basis.shape[1]} components"])
+
+    # search the queries by batches
+    neighbors = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start : start + batch_size]
+
+        if components:
+            candidates, _ = search(reduced, reduce(batch), n_neighbors * oversampling, "euclidean", block_size)
+            rows, distances = _rerank(spectra, batch, candidates, n_neighbors, metric)
+        else:
+            rows, distances = search(spectra, batch, n_neighbors, metric, block_size)
+
+        for name, query_rows, query_distances in zip(names[start : start + batch_size], rows, distances):
+            for rank, (row, distance) in enumerate(zip(query_rows, query_distances), start=1):
+                neighbors.append([name, rank, row, None if codes is None else codes.get(row), distance])
+
+    # prepare output for the neighbors
+    out_csv = Path(pcs.storage.local_dir, "SpectralNeighbors.csv")
+    pd.DataFrame(neighbors, columns=["Query", "Rank", "Row", "Code", "Distance"]).to_csv(out_csv, sep=";", index=False)
+
+    # send time to remote storage
+    dfs_dir_output = pcs.storage.put_file(out_csv)
+
+    # send to downstream
+    out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=";", file_format=".csv")
+    pcs.to_downstream(out_csv)
+
+    return TaskResult(files=[dfs_dir_output])
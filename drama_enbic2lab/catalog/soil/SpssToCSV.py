@@ -1,13 +1,89 @@
+import json
+from dataclasses import dataclass
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyreadstat
 
 from drama.process import Process
 
-from drama.core.model import SimpleTabularDataset
+from drama.core.model import SimpleTabularDataset, TempFile
 from drama.models.task import TaskResult
 
 
-def execute(pcs: Process, drop_index=True):
+@dataclass
+class SpssLabels(TempFile):
+    pass
+
+
+def _labelled_categoricals(df: pd.DataFrame, value_labels: dict) -> pd.DataFrame:
+    """
+    Replace the codes of the labelled variables by their labels as categoricals, codes without a label are kept
+    as text.
+    """
+    for column, labels in value_labels.items():
+        if column in df.columns:
+            values = df[column].map(lambda value: labels.get(value, value))
+            df[column] = values.where(values.isna(), values.astype(str)).astype("category")
+
+    return df
+
+
+def _checked_chunks(chunks):
+    """
+    Yield the chunks of a SPSS reader, reporting the errors of the reading and not those of the caller.
+    """
+    chunks = iter(chunks)
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except:
+            raise ValueError("The format of the file is not valid")
+        yield chunk
+
+
+def _or_empty(chunks, empty: tuple):
+    """
+    Yield the chunks of a SPSS reader, or the `empty` chunk if the file has no rows.
+    """
+    empty_file = True
+    for chunk in chunks:
+        empty_file = False
+        yield chunk
+
+    if empty_file:
+        yield empty
+
+
+def _drop_index(df: pd.DataFrame, drop_index: bool = True) -> pd.DataFrame:
+    """
+    Drop the index column that SPSS files written from pandas keep as a variable.
+    """
+    # Dropping the unname columns to obtain just the factors of analysis
+    if "Unnamed: 0" in df.columns and drop_index:
+        df = df.drop("Unnamed: 0", axis=1)
+
+    return df
+
+
+def read_spss(path, usecols: list = None, drop_index: bool = True) -> pd.DataFrame:
+    """
+    Read a SPSS file at once with its value labels as text, as in the CSV output.
+    """
+    return _drop_index(pd.read_spss(str(path), usecols=usecols), drop_index)
+
+
+def execute(
+    pcs: Process,
+    drop_index=True,
+    chunksize: int = None,
+    workers: int = 1,
+    usecols: list = None,
+    output_format: str = "csv",
+):
 
     """
     Convert the SSPS file into a CSV file
@@ -15,10 +91,17 @@ def execute(pcs: Process, drop_index=True):
         pcs (Process)
     Parameters:
         drop_index(bool): Drop index of tabular dataset
+        chunksize (int): Number of rows read and written at a time, the whole file is read at once if it is not
+            given. Default to None
+        workers (int): Number of processes that read the file. Default to 1
+        usecols (list): Variables to convert, all of them if it is not given. Default to None
+        output_format (str): Format of the output, `csv` with the value labels as text or `parquet` with the
+            labelled variables as categoricals and their metadata in a JSON file. Default to csv
     Inputs:
          TempFile (TempFile): SPSS file
     Outputs:
-        TabularDataSet (Simple Dataset): Convertion of the input file in CSV
+        TabularDataSet (Simple Dataset): Convertion of the input file in CSV (or Parquet)
+        SpssLabels (TempFile): JSON file with the variable and value labels, only with the `parquet` format
 
     Produces:
 
@@ -34,25 +117,111 @@ def execute(pcs: Process, drop_index=True):
 
     local_file_path = pcs.storage.get_file(input_file_resource)
 
-    # Create the dataframe
+    # checking errors
+    if chunksize is not None and chunksize < 1:
+        raise ValueError("Enter a valid chunk size, it must be a positive number of rows")
+
+    if output_format not in ["csv", "parquet"]:
+        raise ValueError("Enter a valid output format, values are 'csv' and 'parquet'")
+
+    # the labels are applied by hand in the parquet output to keep them as categoricals
+    read_options = {"usecols": usecols, "apply_value_formats": output_format == "csv"}
+
+    # variables of the file, read without its data
     try:
-        df = pd.read_spss(local_file_path)
+        empty_df, file_meta = pyreadstat.read_sav(str(local_file_path), metadataonly=True)
     except:
         raise ValueError("The format of the file is not valid")
 
-    # Dropping the unname columns to obtain just the factors of analysis
-    if "Unnamed: 0" in df.columns and drop_index:
-        df = df.drop("Unnamed: 0", axis=1)
+    unknown_variables = [variable for variable in usecols or [] if variable not in file_meta.column_names]
+    if unknown_variables:
+        raise ValueError(f"Enter valid variables, {unknown_variables} are not in the file")
+
+    # labels of the converted variables
+    variables = usecols or file_meta.column_names
+    labels = {
+        key: {variable: value for variable, value in variable_labels.items() if variable in variables}
+        for key, variable_labels in [
+            ("variable_labels", file_meta.column_names_to_labels),
+            ("value_labels", file_meta.variable_value_labels),
+            ("measure", file_meta.variable_measure),
+        ]
+    }
+
+    # Create the dataframe, by blocks of `chunksize` rows if it is given
+    try:
+        if chunksize:
+            chunks = pyreadstat.read_file_in_chunks(
+                pyreadstat.read_sav,
+                local_file_path,
+                chunksize=chunksize,
+                multiprocess=workers > 1,
+                num_processes=workers,
+                **read_options,
+            )
+        elif workers > 1:
+            chunks = [
+                pyreadstat.read_file_multiprocessing(
+                    pyreadstat.read_sav, local_file_path, num_processes=workers, **read_options
+                )
+            ]
+        elif output_format == "csv":
+            chunks = [(read_spss(local_file_path, usecols, drop_index), file_meta)]
+        else:
+            chunks = [pyreadstat.read_sav(local_file_path, **read_options)]
+    except:
+        raise ValueError("The format of the file is not valid")
 
     # prepare the output
-    out_csv = Path(pcs.storage.local_dir, "Data.csv")
-    df.to_csv(out_csv, index=False, sep=";")
+    out_file = Path(pcs.storage.local_dir, "Data.csv" if output_format == "csv" else "Data.parquet")
+    writer = None
+
+    # a file without rows is written with just its header
+    empty = (empty_df[variables], file_meta)
+
+    for number, (df, meta) in enumerate(_or_empty(_checked_chunks(chunks), empty)):
+        df = _drop_index(df, drop_index)
+
+        if output_format == "csv":
+            df.to_csv(out_file, index=False, sep=";", mode="w" if number == 0 else "a", header=number == 0)
+            continue
+
+        # the dictionaries of the categoricals are widened so that every chunk has the same schema
+        table = pa.Table.from_pandas(_labelled_categoricals(df, meta.variable_value_labels), preserve_index=False)
+        if writer is None:
+            schema = pa.schema(
+                [
+                    pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                    if pa.types.is_dictionary(field.type)
+                    else field
+                    for field in table.schema
+                ]
+            )
+            writer = pq.ParquetWriter(out_file, schema)
+        writer.write_table(table.cast(schema))
+
+    if writer is not None:
+        writer.close()
+
+    # send time to remote storage
+    dfs_dir_output = pcs.storage.put_file(out_file)
+
+    # send to downstream
+    out_dataset = SimpleTabularDataset(resource=dfs_dir_output, delimiter=";", file_format=out_file.suffix)
+    pcs.to_downstream(out_dataset)
+
+    if output_format == "csv":
+        return TaskResult(files=[dfs_dir_output])
+
+    # prepare output for the labels
+    out_labels = Path(pcs.storage.local_dir, "Labels.json")
+    with open(out_labels, "w", encoding="utf-8") as file:
+        json.dump(labels, file, indent=3, ensure_ascii=False, default=str)
 
     # send time to remote storage
-    dfs_dir_output = pcs.storage.put_file(out_csv)
+    dfs_dir_labels = pcs.storage.put_file(out_labels)
 
     # send to downstream
-    out_csv = SimpleTabularDataset(resource=dfs_dir_output, delimiter=";", file_format=".csv")
-    pcs.to_downstream(out_csv)
+    pcs.to_downstream(SpssLabels(resource=dfs_dir_labels))
 
-    return TaskResult(files=[dfs_dir_output])
+    return TaskResult(files=[dfs_dir_output, dfs_dir_labels])
@@ -0,0 +1,69 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.Clustering import execute
+
+
+class ClusteringTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_Clustering"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # principal components of three groups of samples
+        rng = np.random.default_rng(0)
+        centers = np.array([[-4.0, 0.0, 1.0], [4.0, 1.0, 0.0], [0.0, 6.0, -1.0]])
+        self.groups = np.repeat(np.arange(3), 1000)
+        scores = centers[self.groups] + rng.normal(scale=0.5, size=(3000, 3))
+
+        dataset = Path(storage.local_dir, "PCA.csv")
+        pd.DataFrame(scores, columns=["PC1", "PC2", "PC3"]).to_csv(dataset, sep=";", index=False)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(
+            return_value={"SimpleTabularDataset": [{"resource": str(dataset), "delimiter": ";"}]}
+        )
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs, k_min=2, k_max=5, batch_size=256, chunksize=700, sample_size=500, seed=0)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Clusters.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "ClusterCentroids.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "ClusterSilhouette.csv").is_file())
+
+        # read the output files to assert that the output is valid
+        clusters_df = pd.read_csv(Path(self.pcs.storage.local_dir, "Clusters.csv"), sep=";")
+        centroids_df = pd.read_csv(Path(self.pcs.storage.local_dir, "ClusterCentroids.csv"), sep=";")
+        silhouette_df = pd.read_csv(Path(self.pcs.storage.local_dir, "ClusterSilhouette.csv"), sep=";")
+
+        self.assertListEqual([2, 3, 4, 5], list(silhouette_df["Clusters"]))
+        self.assertEqual(3, silhouette_df.loc[silhouette_df["Silhouette"].idxmax(), "Clusters"])
+
+        self.assertEqual(3000, len(clusters_df))
+        self.assertListEqual(["PC1", "PC2", "PC3", "Cluster"], list(clusters_df.columns))
+        self.assertEqual(3, len(pd.crosstab(self.groups, clusters_df["Cluster"].values).max(axis=1)))
+        self.assertEqual(3000, pd.crosstab(self.groups, clusters_df["Cluster"].values).max(axis=1).sum())
+
+        self.assertListEqual(["Cluster", "PC1", "PC2", "PC3", "Samples"], list(centroids_df.columns))
+        self.assertListEqual([1000, 1000, 1000], list(centroids_df["Samples"]))
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.CorrelationMatrix import execute
+
+
+class CorrelationMatrixTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_CorrelationMatrix"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # correlated factors with large means and some null values
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=(2000, 4)) @ rng.normal(size=(4, 4)) + 1000
+        values[rng.random(values.shape) < 0.05] = np.nan
+
+        self.df = pd.DataFrame(values, columns=["Clays", "Sand", "Organic Carbon", "pH"])
+        self.df.insert(0, "Code", ["S" + str(x) for x in range(2000)])
+
+        dataset = Path(storage.local_dir, "Data.csv")
+        self.df.to_csv(dataset, sep=";", index=False)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(
+            return_value={"SimpleTabularDataset": [{"resource": str(dataset), "delimiter": ";"}]}
+        )
+
+    def read_output(self) -> pd.DataFrame:
+        return pd.read_csv(Path(self.pcs.storage.local_dir, "CorrelationMatrix.csv"), sep=";", index_col="Factor")
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs, chunksize=300)
+
+        # assert output file exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "CorrelationMatrix.csv").is_file())
+
+        # assert the pairwise-complete correlation of the numeric factors
+        correlation_df = self.read_output()
+        expected_df = self.df.drop(columns="Code").corr()
+
+        self.assertListEqual(list(expected_df.columns), list(correlation_df.columns))
+        np.testing.assert_allclose(expected_df.values, correlation_df.values, atol=1e-10)
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def test_float32(self):
+        execute(pcs=self.pcs, pairwise=False, dtype="float32", chunksize=300)
+
+        expected_df = self.df.drop(columns="Code").dropna().corr()
+        np.testing.assert_allclose(expected_df.values, self.read_output().values, atol=1e-5)
+
+    def test_spearman(self):
+        execute(pcs=self.pcs, method="spearman", pairwise=False, chunksize=300)
+
+        expected_df = self.df.drop(columns="Code").dropna().corr(method="spearman")
+        np.testing.assert_allclose(expected_df.values, self.read_output().values, atol=1e-10)
+
+        # the ranks are not kept
+        self.assertFalse(Path(self.pcs.storage.local_dir, "CorrelationRanks.dat").exists())
+
+    def test_pairwise_spearman(self):
+        # every pair is ranked over the samples where both factors are present
+        execute(pcs=self.pcs, method="spearman", chunksize=300)
+
+        expected_df = self.df.drop(columns="Code").corr(method="spearman")
+        np.testing.assert_allclose(expected_df.values, self.read_output().values, atol=1e-10)
+
+    def test_spearman_errors(self):
+        local_files = sorted(Path(self.pcs.storage.local_dir).iterdir())
+
+        with patch("drama_enbic2lab.catalog.soil.CorrelationMatrix._rank_columns", side_effect=MemoryError):
+            with self.assertRaises(MemoryError):
+                execute(pcs=self.pcs, method="spearman", chunksize=300)
+
+        # assert the ranks are removed
+        self.assertListEqual(local_files, sorted(Path(self.pcs.storage.local_dir).iterdir()))
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
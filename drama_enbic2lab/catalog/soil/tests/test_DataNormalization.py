@@ -3,6 +3,8 @@ import unittest
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import pandas as pd
+
 from drama.storage import LocalStorage
 
 from drama_enbic2lab.catalog.soil.DataNormalization import execute
@@ -59,6 +61,80 @@ class DataNormalizationTestCase(unittest.TestCase):
         # assert output data is valid
         self.assertIs(type(data), TaskResult)
 
+    def test_chunks(self):
+        # execute func reading the whole file
+        execute(pcs=self.pcs)
+        expected = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        # execute func in two passes over chunks of the file
+        execute(pcs=self.pcs, chunksize=64)
+        streamed = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        # assert output is the same
+        pd.testing.assert_frame_equal(expected, streamed, check_exact=False, rtol=1e-10)
+
+        # execute func with a single precision output
+        execute(pcs=self.pcs, chunksize=64, dtype="float32")
+        single = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        pd.testing.assert_frame_equal(expected, single, check_exact=False, rtol=1e-5, atol=1e-6)
+
+    def test_apply_only(self):
+        # execute func fitting the scaler
+        data = execute(pcs=self.pcs)
+        expected = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "ScalerParameters.csv").is_file())
+
+        scaler_df = pd.read_csv(Path(self.pcs.storage.local_dir, "ScalerParameters.csv"), sep=";", index_col=0)
+        self.assertListEqual(["Mean", "Std"], list(scaler_df.columns))
+        self.assertListEqual(list(expected.columns), list(scaler_df.index))
+
+        # execute func on a batch with the columns in another order, only scaling it
+        dataset = pd.read_csv(Path(RESOURCES, "Data.csv"), sep=";")
+        dataset.iloc[:, ::-1].to_csv(Path(self.pcs.storage.local_dir, "Batch.csv"), sep=";", index=False)
+
+        self.pcs.get_from_upstream.return_value = {
+            "SimpleTabularDataset": [
+                {"resource": str(Path(self.pcs.storage.local_dir, "Batch.csv")), "delimiter": ";"}
+            ],
+            "SimpleTabularDatasetScaler": [{"resource": data.files[1], "delimiter": ";"}],
+        }
+        execute(pcs=self.pcs, chunksize=100)
+        applied = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        # assert output is the same
+        pd.testing.assert_frame_equal(expected, applied, check_exact=False, rtol=1e-10)
+
+        # the samples dropped for null values are the same with and without the scaler parameters
+        dataset.loc[[3, 7], "pmm"] = None
+        dataset.loc[[5], "HumGen"] = None
+        dataset["Depth"] = 10.0
+        dataset.loc[[9], "Depth"] = None
+        dataset.to_csv(Path(self.pcs.storage.local_dir, "Batch.csv"), sep=";", index=False)
+
+        execute(pcs=self.pcs, chunksize=100)
+        applied = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        self.pcs.get_from_upstream.return_value.pop("SimpleTabularDatasetScaler")
+        execute(pcs=self.pcs, chunksize=100)
+        fitted = pd.read_csv(Path(self.pcs.storage.local_dir, "DataNormalized.csv"), sep=";")
+
+        self.assertEqual(len(fitted), len(applied))
+        self.assertEqual(len(expected) - 4, len(applied))
+
+    def test_empty(self):
+        # dataset with just its header
+        empty_path = Path(self.pcs.storage.local_dir, "Empty.csv")
+        empty_path.write_text("pmm;DensidadAp\n")
+        self.pcs.get_from_upstream.return_value = {
+            "SimpleTabularDataset": [{"resource": str(empty_path), "delimiter": ";"}]
+        }
+
+        with self.assertRaisesRegex(ValueError, "Enter a dataset with at least one sample"):
+            execute(pcs=self.pcs, chunksize=64)
+
     def tearDown(self) -> None:
         self.pcs.storage.remove_local_dir()
 
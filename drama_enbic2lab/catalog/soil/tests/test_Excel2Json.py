@@ -0,0 +1,260 @@
+import gzip
+import json
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import geopandas as gpd
+import pandas as pd
+from PIL import Image
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.Excel2Json import execute
+from drama_enbic2lab.catalog.soil.utils import StemIndex, morton_order, read_table_bbox, row_group_bounds
+
+
+class Excel2JsonTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_Excel2Json"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # zip with two sampling workbooks, their photographs and spectra
+        campaign_one = pd.DataFrame(
+            {
+                "CÓDIGO": ["S1", "S2"],
+                "COORDENADAS X": [350000.0, 351000.0],
+                "COORDENADAS Y": [4070000.0, 4071000.0],
+                "CARBONO ORGÁNICO": [1.2, 0.8],
+                "FOTOGRAFÍAS": ["S1_a, S1_b", "S2_a"],
+                "RESPUESTA ESPECTRAL": ["S1", None],
+            }
+        )
+        campaign_two = pd.DataFrame(
+            {
+                "CÓDIGO": ["S3"],
+                "COORDENADAS X": [352000.0],
+                "COORDENADAS Y": [4072000.0],
+                "CARBONO ORGÁNICO": [2.1],
+                "FOTOGRAFÍAS": [None],
+                "RESPUESTA ESPECTRAL": ["S3"],
+            }
+        )
+
+        zip_path = Path(storage.local_dir, "input_soil.zip")
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            for name, campaign in [("campaign_one.xlsx", campaign_one), ("campaign_two.xlsx", campaign_two)]:
+                excel_path = Path(storage.local_dir, name)
+                campaign.to_excel(excel_path, sheet_name="EJEMPLO", index=False)
+                zip_file.write(excel_path, f"soil/{name}")
+                excel_path.unlink()
+            for name in ["S1_a.jpg", "S1_b.JPG", "S2_a.jpg", "S9.jpg"]:
+                zip_file.writestr(f"soil/photos/{name}", f"photo {name}".encode())
+            for name in ["S1.asd", "S3.asd"]:
+                zip_file.writestr(f"soil/spectra/{name}", f"spectrum {name}".encode())
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(return_value={"TempFile": [{"resource": str(zip_path)}]})
+
+    def _read_records(self) -> list:
+        with Path(self.pcs.storage.local_dir, "out.json").open(encoding="utf-8") as fin:
+            return json.load(fin)
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs, author="Khaos", group="Khaos Research", project="Soil")
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "out.json").is_file())
+
+        # read the output file to assert that the output is valid
+        records = self._read_records()
+
+        self.assertListEqual(["S1", "S2", "S3"], [record["Code"] for record in records])
+        self.assertListEqual(["S1_a.jpg", "S1_b.JPG"], sorted(Path(path).name for path in records[0]["Pictures Path"]))
+        self.assertListEqual(["S1.asd"], [Path(path).name for path in records[0]["Spectral Response Path"]])
+        self.assertIsNone(records[1]["Spectral Response Path"])
+        self.assertIsNone(records[2]["Pictures Path"])
+        self.assertEqual("Khaos", records[2]["Author"])
+        self.assertNotIn("FOTOGRAFÍAS", records[0])
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def test_workers(self):
+        # execute func parsing the workbooks in a process pool
+        execute(pcs=self.pcs, workers=2)
+        parallel_records = self._read_records()
+
+        execute(pcs=self.pcs)
+        serial_records = self._read_records()
+
+        # assert output is the same
+        self.assertListEqual(serial_records, parallel_records)
+
+    def test_streaming(self):
+        # execute func extracting the zip
+        execute(pcs=self.pcs)
+        extracted_records = self._read_records()
+        self.tearDown()
+        self.setUp()
+
+        # execute func reading the members of the zip
+        with patch.object(self.pcs.storage, "put_file", wraps=self.pcs.storage.put_file) as put_file:
+            execute(pcs=self.pcs, extract=False)
+        streamed_records = self._read_records()
+
+        # assert output is the same and only the referenced media are uploaded
+        self.assertListEqual(extracted_records, streamed_records)
+        self.assertListEqual(
+            ["MediaIndex.json", "S1.asd", "S1_a.jpg", "S1_b.JPG", "S2_a.jpg", "S3.asd", "out.json"],
+            sorted(Path(call.args[0]).name for call in put_file.call_args_list),
+        )
+        self.assertFalse(Path(self.pcs.storage.local_dir, "input").exists())
+
+    def test_streaming_errors(self):
+        # zip without workbooks
+        zip_path = Path(self.pcs.storage.local_dir, "input_photos.zip")
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("soil/photos/S1_a.jpg", b"photo S1_a.jpg")
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": str(zip_path)}]}
+
+        local_files = sorted(Path(self.pcs.storage.local_dir).iterdir())
+
+        with self.assertRaisesRegex(Exception, "No found excel files"):
+            execute(pcs=self.pcs, extract=False, thumbnails=True)
+
+        # assert the temporary files are removed
+        self.assertListEqual(local_files, sorted(Path(self.pcs.storage.local_dir).iterdir()))
+
+    def test_media_index(self):
+        # execute func uploading the media
+        data = execute(pcs=self.pcs, upload_workers=2)
+        first_records = self._read_records()
+
+        # execute func again with the media index of the first run
+        self.pcs.get_from_upstream.return_value["MediaIndex"] = [{"resource": data.files[1]}]
+        with patch.object(self.pcs.storage, "put_file", wraps=self.pcs.storage.put_file) as put_file:
+            execute(pcs=self.pcs, upload_workers=2)
+        second_records = self._read_records()
+
+        # assert output is the same and the media are not uploaded again
+        self.assertListEqual(first_records, second_records)
+        self.assertListEqual(
+            ["MediaIndex.json", "out.json"], sorted(Path(call.args[0]).name for call in put_file.call_args_list)
+        )
+
+    def test_ndjson(self):
+        # execute func writing a JSON array
+        execute(pcs=self.pcs)
+        array_records = self._read_records()
+
+        # execute func writing compressed JSON Lines
+        data = execute(pcs=self.pcs, output_format="ndjson", compress=True)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "out.ndjson.gz").is_file())
+
+        # assert output is the same
+        with gzip.open(Path(self.pcs.storage.local_dir, "out.ndjson.gz"), "rt", encoding="utf-8") as fin:
+            lines_records = [json.loads(line) for line in fin]
+
+        self.assertListEqual(array_records, lines_records)
+        self.assertEqual("out.ndjson.gz", Path(data.files[0]).name)
+
+    def test_geoparquet(self):
+        # execute func writing the samples as GeoParquet too
+        data = execute(pcs=self.pcs, output_format="ndjson", geoparquet=True, row_group_size=2, crs="EPSG:25830")
+        geoparquet_path = Path(self.pcs.storage.local_dir, "out.parquet")
+
+        # assert output file exists
+        self.assertTrue(geoparquet_path.is_file())
+        self.assertEqual(3, len(data.files))
+
+        # read the output file to assert that the output is valid
+        samples = gpd.read_parquet(geoparquet_path)
+
+        self.assertListEqual(["S1", "S2", "S3"], list(samples["Code"]))
+        self.assertEqual("EPSG:25830", samples.crs.to_string())
+        self.assertListEqual([350000.0, 4070000.0], [samples.geometry[0].x, samples.geometry[0].y])
+        self.assertListEqual(["S1.asd"], [Path(path).name for path in samples["Spectral Response Path"][0]])
+
+        # assert the row groups are only read when they intersect the bounding box
+        self.assertListEqual(
+            [(350000.0, 4070000.0, 351000.0, 4071000.0), (352000.0, 4072000.0, 352000.0, 4072000.0)],
+            row_group_bounds(geoparquet_path),
+        )
+        self.assertListEqual(["S3"], list(read_table_bbox(geoparquet_path, (351500, 4071500, 353000, 4073000))["Code"]))
+
+    def test_thumbnails(self):
+        # zip with photographs of a sample, and a photograph that is not a valid image
+        campaign = pd.DataFrame(
+            {"CÓDIGO": ["S1", "S2"], "FOTOGRAFÍAS": ["S1_a", "S2_a"], "RESPUESTA ESPECTRAL": [None, None]}
+        )
+
+        zip_path = Path(self.pcs.storage.local_dir, "input_photos.zip")
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            excel_path = Path(self.pcs.storage.local_dir, "campaign.xlsx")
+            campaign.to_excel(excel_path, sheet_name="EJEMPLO", index=False)
+            zip_file.write(excel_path, "soil/campaign.xlsx")
+            excel_path.unlink()
+
+            photo_path = Path(self.pcs.storage.local_dir, "S1_a.jpg")
+            Image.new("RGB", (2000, 1000), (120, 80, 40)).save(photo_path)
+            zip_file.write(photo_path, "soil/photos/S1_a.jpg")
+            photo_path.unlink()
+
+            zip_file.writestr("soil/photos/S2_a.jpg", b"photo S2_a.jpg")
+
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": str(zip_path)}]}
+
+        for extract in [True, False]:
+            # execute func rendering the thumbnails and previews
+            execute(pcs=self.pcs, extract=extract, thumbnails=True, thumbnail_size=128, preview_size=512)
+            records = self._read_records()
+
+            # assert the previews are uploaded next to the originals
+            thumbnail_path, preview_path = (
+                records[0]["Pictures Thumbnail Path"][0],
+                records[0]["Pictures Preview Path"][0],
+            )
+            self.assertEqual("S1_a_thumbnail.jpg", Path(thumbnail_path).name)
+            self.assertEqual("S1_a_preview.jpg", Path(preview_path).name)
+
+            with Image.open(thumbnail_path) as thumbnail, Image.open(preview_path) as preview:
+                self.assertEqual((128, 64), thumbnail.size)
+                self.assertEqual((512, 256), preview.size)
+
+            self.assertListEqual([None], records[1]["Pictures Thumbnail Path"])
+            self.assertEqual(1, len(records[1]["Pictures Path"]))
+
+    def test_morton_order(self):
+        # points of every quadrant go together, the ones without coordinates go last
+        x = [0.0, 3.0, 1.0, None, 0.0, 2.0]
+        y = [0.0, 3.0, 1.0, 1.0, 3.0, 0.0]
+
+        self.assertListEqual([0, 2, 5, 4, 1, 3], list(morton_order(x, y)))
+
+    def test_stem_index(self):
+        # stems of several lengths, repeated stems and names with several dots
+        paths = ["a/S1.jpg", "b/S1.JPG", "S10.jpg", "x/S1_a.b.jpg", "1.jpg", "S2.asd", "dir.v2/S3.tar.asd"]
+        texts = ["S1", "S10, S1_a", "S2 S3", "nan", None, "", "S3.tar"]
+
+        index = StemIndex(paths)
+
+        # assert the index finds the same files as scanning the list
+        for text in texts:
+            expected = [path for path in paths if path.split("/")[-1].split(".")[0] in str(text)]
+            self.assertListEqual(expected, index.match(text))
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,9 @@ import unittest
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import numpy as np
+import pandas as pd
+
 from drama.storage import LocalStorage
 
 from drama_enbic2lab.catalog.soil.Pca import execute
@@ -59,6 +62,97 @@ class PcaTestCase(unittest.TestCase):
         # assert output data is valid
         self.assertIs(type(data), TaskResult)
 
+    def _read_output(self) -> pd.DataFrame:
+        return pd.read_csv(Path(self.pcs.storage.local_dir, "PCA.csv"), sep=";")
+
+    def test_svd_solver(self):
+        # execute func with the full decomposition
+        execute(pcs=self.pcs)
+        expected = self._read_output()
+
+        # execute func growing a randomized decomposition
+        execute(pcs=self.pcs, svd_solver="randomized", seed=0)
+        randomized = self._read_output()
+
+        # assert output is the same up to the sign of the components
+        self.assertListEqual(list(expected.columns), list(randomized.columns))
+        np.testing.assert_allclose(np.abs(expected.values), np.abs(randomized.values), atol=1e-4)
+
+        # execute func with a fixed number of components
+        execute(pcs=self.pcs, svd_solver="randomized", number_components=2, seed=0)
+        self.assertListEqual(["PC1", "PC2"], list(self._read_output().columns))
+
+    def test_chunks(self):
+        # execute func with the full decomposition
+        execute(pcs=self.pcs)
+        expected = self._read_output()
+
+        # execute func fitting an incremental PCA, the last chunk is shorter than the others
+        execute(pcs=self.pcs, chunksize=120)
+        incremental = self._read_output()
+
+        # assert output is the same up to the sign of the components
+        self.assertListEqual(list(expected.columns), list(incremental.columns))
+        np.testing.assert_allclose(np.abs(expected.values), np.abs(incremental.values), atol=1e-6)
+
+        # assert chunks must have more rows than factors
+        with self.assertRaises(ValueError):
+            execute(pcs=self.pcs, chunksize=10)
+
+    def test_projection_only(self):
+        # execute func fitting the PCA
+        data = execute(pcs=self.pcs)
+        expected = self._read_output()
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "PCAModel.npz").is_file())
+
+        with np.load(Path(self.pcs.storage.local_dir, "PCAModel.npz")) as model:
+            self.assertTupleEqual((4, 19), model["components"].shape)
+            self.assertEqual("pmm", model["factors"][0])
+
+        # execute func on a batch with the columns in another order, only projecting it
+        dataset = pd.read_csv(Path(RESOURCES, "DataNormalized.csv"), sep=";")
+        dataset.iloc[:, ::-1].to_csv(Path(self.pcs.storage.local_dir, "Batch.csv"), sep=";", index=False)
+
+        self.pcs.get_from_upstream.return_value = {
+            "SimpleTabularDataset": [
+                {"resource": str(Path(self.pcs.storage.local_dir, "Batch.csv")), "delimiter": ";"}
+            ],
+            "PcaModel": [{"resource": data.files[1]}],
+        }
+        execute(pcs=self.pcs, chunksize=100)
+        projected = self._read_output()
+
+        # assert output is the same
+        pd.testing.assert_frame_equal(expected, projected, check_exact=False, rtol=1e-10)
+
+    def test_bootstrap(self):
+        # execute func with the bootstrap resamples in a process pool
+        data = execute(pcs=self.pcs, bootstrap=120, workers=2, seed=0)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "PCABootstrap.csv").is_file())
+
+        # read the output file to assert that the output is valid
+        parallel = pd.read_csv(Path(self.pcs.storage.local_dir, "PCABootstrap.csv"), sep=";")
+
+        self.assertEqual(4 + 4 * 19, len(parallel))
+        self.assertListEqual(["Statistic", "Component", "Factor", "Estimate", "Lower", "Upper"], list(parallel.columns))
+        self.assertTrue((parallel["Lower"] <= parallel["Upper"]).all())
+
+        ratios = parallel[parallel["Statistic"] == "Explained variance ratio"]
+        self.assertTrue(((ratios["Lower"] <= ratios["Estimate"]) & (ratios["Estimate"] <= ratios["Upper"])).all())
+
+        # assert the resamples do not depend on the number of processes
+        execute(pcs=self.pcs, bootstrap=120, seed=0)
+        serial = pd.read_csv(Path(self.pcs.storage.local_dir, "PCABootstrap.csv"), sep=";")
+
+        pd.testing.assert_frame_equal(serial, parallel)
+
+        # assert output data is valid
+        self.assertEqual(3, len(data.files))
+
     def tearDown(self) -> None:
         self.pcs.storage.remove_local_dir()
 
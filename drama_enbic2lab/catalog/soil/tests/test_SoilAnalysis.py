@@ -0,0 +1,79 @@
+import shutil
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil import DataNormalization, Pca, SpssToCSV
+from drama_enbic2lab.catalog.soil.SoilAnalysis import execute
+from drama_enbic2lab.catalog.soil.tests import RESOURCES
+
+
+class SoilAnalysisTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_SoilAnalysis"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # copy file to task dir
+        self.dataset = shutil.copy(Path(RESOURCES, "ExampleData.sav"), storage.local_dir)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(return_value={"TempFile": [{"resource": self.dataset}]})
+
+    def _read_output(self, name: str) -> pd.DataFrame:
+        return pd.read_csv(Path(self.pcs.storage.local_dir, name), sep=";")
+
+    def test_integration(self):
+        # execute the three components one after the other
+        data = SpssToCSV.execute(pcs=self.pcs)
+        self.pcs.get_from_upstream.return_value = {
+            "SimpleTabularDataset": [{"resource": data.files[0], "delimiter": ";"}]
+        }
+        data = DataNormalization.execute(pcs=self.pcs)
+        self.pcs.get_from_upstream.return_value = {
+            "SimpleTabularDataset": [{"resource": data.files[0], "delimiter": ";"}]
+        }
+        Pca.execute(pcs=self.pcs)
+
+        expected_pca = self._read_output("PCA.csv")
+        expected_scaler = self._read_output("ScalerParameters.csv")
+
+        # execute func
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": self.dataset}]}
+        data = execute(pcs=self.pcs)
+
+        # assert output is the same
+        pd.testing.assert_frame_equal(expected_pca, self._read_output("PCA.csv"), check_exact=False, rtol=1e-8)
+        pd.testing.assert_frame_equal(
+            expected_scaler, self._read_output("ScalerParameters.csv"), check_exact=False, rtol=1e-8
+        )
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+        self.assertEqual(3, len(data.files))
+
+    def test_persist_intermediates(self):
+        # execute func
+        data = execute(pcs=self.pcs, number_components=3, persist_intermediates=True)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Data.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "DataNormalized.csv").is_file())
+
+        self.assertListEqual(["PC1", "PC2", "PC3"], list(self._read_output("PCA.csv").columns))
+        self.assertEqual(550, len(self._read_output("Data.csv")))
+        self.assertEqual(5, len(data.files))
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import struct
+import unittest
+import zipfile
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.SpectralLibrary import execute, read_asd
+
+
+def asd_content(values, data_type: int = 1, data_format: int = 0, reference=None) -> bytes:
+    """
+    Binary ASD file with the spectrum `values` from 350 nm by 1 nm, and the white `reference` if it is given.
+    """
+    dtype = {0: "<f4", 1: "<i4", 2: "<f8"}[data_format]
+
+    header = bytearray(484)
+    header[:3] = b"as7"
+    header[186] = data_type
+    struct.pack_into("<ff", header, 191, 350.0, 1.0)
+    header[199] = data_format
+    struct.pack_into("<H", header, 204, len(values))
+
+    content = bytes(header) + np.asarray(values, dtype=dtype).tobytes()
+    if reference is not None:
+        description = b"white reference"
+        content += struct.pack("<H16sH", 1, bytes(16), len(description)) + description
+        content += np.asarray(reference, dtype=dtype).tobytes()
+
+    return content
+
+
+class SpectralLibraryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_SpectralLibrary"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # zip with a sampling workbook and the spectra of two of its samples and of an unknown one
+        rng = np.random.default_rng(0)
+        self.spectra = rng.random((3, 50))
+
+        campaign = pd.DataFrame(
+            {
+                "CÓDIGO": ["S1", "S2", "S3"],
+                "CARBONO ORGÁNICO": [1.2, 0.8, 2.1],
+                "FOTOGRAFÍAS": [None, None, None],
+                "RESPUESTA ESPECTRAL": ["S1", None, "S3"],
+            }
+        )
+
+        zip_path = Path(storage.local_dir, "input_soil.zip")
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            excel_path = Path(storage.local_dir, "campaign.xlsx")
+            campaign.to_excel(excel_path, sheet_name="EJEMPLO", index=False)
+            zip_file.write(excel_path, "soil/campaign.xlsx")
+            excel_path.unlink()
+
+            zip_file.writestr("soil/spectra/S1.asd", asd_content(self.spectra[0]))
+            zip_file.writestr(
+                "soil/spectra/S3.asd",
+                asd_content(self.spectra[1] * 1000, data_type=0, data_format=2, reference=np.full(50, 1000.0)),
+            )
+            zip_file.writestr("soil/spectra/S9.asd", asd_content(self.spectra[2], data_format=2))
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(return_value={"TempFile": [{"resource": str(zip_path)}]})
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "SpectralLibrary.npy").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "SpectralIndex.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Wavelengths.csv").is_file())
+
+        # read the output files to assert that the output is valid
+        library = np.load(Path(self.pcs.storage.local_dir, "SpectralLibrary.npy"), mmap_mode="r")
+        index_df = pd.read_csv(Path(self.pcs.storage.local_dir, "SpectralIndex.csv"), sep=";")
+        wavelengths_df = pd.read_csv(Path(self.pcs.storage.local_dir, "Wavelengths.csv"), sep=";")
+
+        self.assertEqual(np.float32, library.dtype)
+        self.assertEqual((3, 50), library.shape)
+        np.testing.assert_allclose(self.spectra, library, rtol=1e-6)
+
+        self.assertListEqual([0, 1, 2], list(index_df["Row"]))
+        self.assertListEqual(["S1", "S3"], list(index_df["Code"][:2]))
+        self.assertTrue(pd.isna(index_df["Code"][2]))
+        self.assertListEqual(
+            ["soil/spectra/S1.asd", "soil/spectra/S3.asd", "soil/spectra/S9.asd"], list(index_df["File"])
+        )
+
+        self.assertListEqual(list(np.arange(350.0, 400.0)), list(wavelengths_df["Wavelength"]))
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def test_read_asd(self):
+        # raw spectra are only divided by the reference when asked
+        content = asd_content([200, 300], data_type=0, data_format=1, reference=[400, 600])
+
+        wavelengths, values = read_asd(content)
+        self.assertListEqual([350.0, 351.0], list(wavelengths))
+        self.assertListEqual([0.5, 0.5], list(values))
+
+        _, values = read_asd(content, reflectance=False)
+        self.assertListEqual([200.0, 300.0], list(values))
+
+        with self.assertRaises(ValueError):
+            read_asd(b"spectrum")
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.SpectralSearch import execute, search
+
+
+class SpectralSearchTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_SpectralSearch"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # library of spectra mixing a few smooth profiles, the queries are noisy copies of some of them
+        rng = np.random.default_rng(0)
+        profiles = np.sin(np.outer(np.arange(1, 9), np.linspace(0, np.pi, 120))) + 1
+        self.spectra = (rng.random((3000, 8)) @ profiles).astype(np.float32)
+
+        self.sources = np.array([5, 1200, 2999, 42])
+        queries = self.spectra[self.sources] + rng.normal(scale=1e-3, size=(4, 120))
+
+        library_path = Path(storage.local_dir, "SpectralLibrary.npy")
+        np.save(library_path, self.spectra)
+
+        queries_path = Path(storage.local_dir, "Queries.npy")
+        np.save(queries_path, queries)
+
+        index_path = Path(storage.local_dir, "SpectralIndex.csv")
+        pd.DataFrame({"Row": range(3000), "Code": ["S" + str(x) for x in range(3000)]}).to_csv(
+            index_path, sep=";", index=False
+        )
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(
+            return_value={
+                "SpectralLibrary": [{"resource": str(library_path)}],
+                "TempFile": [{"resource": str(queries_path)}],
+                "SimpleTabularDataset": [{"resource": str(index_path), "delimiter": ";"}],
+            }
+        )
+
+    def read_output(self) -> pd.DataFrame:
+        return pd.read_csv(Path(self.pcs.storage.local_dir, "SpectralNeighbors.csv"), sep=";")
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs, n_neighbors=3, batch_size=3, block_size=700)
+
+        # assert output file exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "SpectralNeighbors.csv").is_file())
+
+        # the nearest spectrum of every query is the one it was copied from
+        neighbors_df = self.read_output()
+
+        self.assertListEqual(["Query", "Rank", "Row", "Code", "Distance"], list(neighbors_df.columns))
+        self.assertEqual(12, len(neighbors_df))
+
+        nearest_df = neighbors_df[neighbors_df["Rank"] == 1]
+        self.assertListEqual(list(self.sources), list(nearest_df["Row"]))
+        self.assertListEqual(["S" + str(x) for x in self.sources], list(nearest_df["Code"]))
+        self.assertTrue((neighbors_df.groupby("Query")["Distance"].diff().dropna() >= 0).all())
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def test_reduced(self):
+        # the candidates of the reduced spectra are ranked by their exact distance
+        execute(pcs=self.pcs, n_neighbors=5, metric="euclidean", components=8, seed=0)
+        reduced_df = self.read_output()
+
+        execute(pcs=self.pcs, n_neighbors=5, metric="euclidean")
+        exact_df = self.read_output()
+
+        self.assertListEqual(list(exact_df["Row"]), list(reduced_df["Row"]))
+        np.testing.assert_allclose(exact_df["Distance"], reduced_df["Distance"], rtol=1e-4)
+
+    def test_reduced_cosine(self):
+        # noisy library and queries, the candidates of the cosine metric are searched on the normalized spectra
+        rng = np.random.default_rng(1)
+        profiles = np.sin(np.outer(np.arange(1, 9), np.linspace(0, np.pi, 120))) + 1
+        spectra = rng.random((3000, 8)) @ profiles + rng.normal(scale=0.05, size=(3000, 120))
+        queries = rng.random((200, 8)) @ profiles + rng.normal(scale=0.05, size=(200, 120))
+
+        np.save(Path(self.pcs.storage.local_dir, "SpectralLibrary.npy"), spectra.astype(np.float32))
+        np.save(Path(self.pcs.storage.local_dir, "Queries.npy"), queries)
+
+        execute(pcs=self.pcs, n_neighbors=5, metric="cosine", components=8, seed=0)
+        reduced_df = self.read_output()
+
+        execute(pcs=self.pcs, n_neighbors=5, metric="cosine")
+        exact_df = self.read_output()
+
+        self.assertListEqual(list(exact_df["Row"]), list(reduced_df["Row"]))
+        np.testing.assert_allclose(exact_df["Distance"], reduced_df["Distance"], rtol=1e-4)
+
+    def test_search(self):
+        # blocks give the same neighbors as the brute force
+        queries = self.spectra[:10] + 0.01
+        rows, distances = search(self.spectra, queries, 4, metric="euclidean", block_size=333)
+
+        brute = np.linalg.norm(queries[:, None, :] - self.spectra[None, :, :], axis=2)
+        np.testing.assert_array_equal(np.argsort(brute, axis=1)[:, :4], rows)
+        np.testing.assert_allclose(np.sort(brute, axis=1)[:, :4], distances, rtol=1e-3)
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
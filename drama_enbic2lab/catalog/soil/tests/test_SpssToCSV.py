@@ -0,0 +1,155 @@
+import json
+import shutil
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pyreadstat
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.soil.SpssToCSV import execute
+from drama_enbic2lab.catalog.soil.tests import RESOURCES
+
+
+class SpssToCSVTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_SpssToCSV"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # copy file to task dir
+        dataset = shutil.copy(Path(RESOURCES, "ExampleData.sav"), storage.local_dir)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(return_value={"TempFile": [{"resource": dataset}]})
+
+    def _read_output(self) -> str:
+        with Path(self.pcs.storage.local_dir, "Data.csv").open() as fin:
+            return fin.read()
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Data.csv").is_file())
+
+        # read the output file to assert that the output is valid
+        lines = self._read_output().splitlines()
+
+        self.assertEqual(551, len(lines))
+        self.assertTrue(lines[0].startswith("pmm;DensidadAp;Arenasmuyfinas"))
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def test_chunks(self):
+        # execute func reading the whole file
+        execute(pcs=self.pcs)
+        expected = self._read_output()
+
+        # execute func reading the file by chunks and in several processes
+        execute(pcs=self.pcs, chunksize=100)
+        self.assertMultiLineEqual(expected, self._read_output())
+
+        execute(pcs=self.pcs, chunksize=100, workers=2)
+        self.assertMultiLineEqual(expected, self._read_output())
+
+        execute(pcs=self.pcs, workers=2)
+        self.assertMultiLineEqual(expected, self._read_output())
+
+    def test_errors(self):
+        # the files that can not be read are reported as not valid
+        invalid_path = Path(self.pcs.storage.local_dir, "Invalid.sav")
+        invalid_path.write_bytes(b"not a SPSS file")
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": str(invalid_path)}]}
+
+        with self.assertRaisesRegex(ValueError, "The format of the file is not valid"):
+            execute(pcs=self.pcs, chunksize=100)
+
+        # the variables must be in the file
+        dataset = str(Path(self.pcs.storage.local_dir, "ExampleData.sav"))
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": dataset}]}
+
+        with self.assertRaisesRegex(ValueError, "Enter valid variables"):
+            execute(pcs=self.pcs, usecols=["Nope"], output_format="parquet")
+
+        # the errors writing the output are not
+        with patch.object(pd.DataFrame, "to_csv", side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                execute(pcs=self.pcs, chunksize=100)
+
+    def test_parquet(self):
+        # labelled SPSS file
+        dataset = pd.DataFrame(
+            {
+                "Code": [1.0, 2.0, 1.0, 3.0, None],
+                "Texture": [1.0, 2.0, 2.0, 1.0, 9.0],
+                "Carbon": [1.2, 0.8, 2.1, 1.5, 0.9],
+            }
+        )
+        labelled_path = Path(self.pcs.storage.local_dir, "Labelled.sav")
+        pyreadstat.write_sav(
+            dataset,
+            str(labelled_path),
+            column_labels={"Texture": "Soil texture"},
+            variable_value_labels={"Texture": {1.0: "Sandy", 2.0: "Clay"}},
+        )
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": str(labelled_path)}]}
+
+        # execute func
+        data = execute(pcs=self.pcs, usecols=["Texture", "Carbon"], output_format="parquet", chunksize=2)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Data.parquet").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "Labels.json").is_file())
+
+        # read the output files to assert that the output is valid
+        df = pd.read_parquet(Path(self.pcs.storage.local_dir, "Data.parquet"))
+
+        self.assertListEqual(["Texture", "Carbon"], list(df.columns))
+        self.assertEqual("category", df["Texture"].dtype.name)
+        self.assertListEqual(["Sandy", "Clay", "Clay", "Sandy", "9.0"], list(df["Texture"]))
+        self.assertListEqual([1.2, 0.8, 2.1, 1.5, 0.9], list(df["Carbon"]))
+
+        with Path(self.pcs.storage.local_dir, "Labels.json").open(encoding="utf-8") as fin:
+            labels = json.load(fin)
+
+        self.assertEqual("Soil texture", labels["variable_labels"]["Texture"])
+        self.assertDictEqual({"1.0": "Sandy", "2.0": "Clay"}, labels["value_labels"]["Texture"])
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+        self.assertEqual(2, len(data.files))
+
+    def test_empty(self):
+        # SPSS file without rows
+        dataset = pd.DataFrame({"Texture": pd.Series([], dtype=float), "Carbon": pd.Series([], dtype=float)})
+        empty_path = Path(self.pcs.storage.local_dir, "Empty.sav")
+        pyreadstat.write_sav(dataset, str(empty_path), variable_value_labels={"Texture": {1.0: "Sandy"}})
+        self.pcs.get_from_upstream.return_value = {"TempFile": [{"resource": str(empty_path)}]}
+
+        # execute func, the outputs only have the header
+        execute(pcs=self.pcs, chunksize=2)
+        self.assertEqual("Texture;Carbon", self._read_output().strip())
+
+        execute(pcs=self.pcs, output_format="parquet", chunksize=2)
+        df = pd.read_parquet(Path(self.pcs.storage.local_dir, "Data.parquet"))
+
+        self.assertListEqual(["Texture", "Carbon"], list(df.columns))
+        self.assertEqual(0, len(df))
+
+        with Path(self.pcs.storage.local_dir, "Labels.json").open(encoding="utf-8") as fin:
+            self.assertDictEqual({"1.0": "Sandy"}, json.load(fin)["value_labels"]["Texture"])
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,385 @@
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+def file_stem(path) -> str:
+    """
+    Name of a file up to its first dot, the key the workbooks use to reference photographs and spectra.
+    """
+    return str(path).split("/")[-1].split(".")[0]
+
+
+class StemIndex:
+    """
+    Index of file paths by stem that finds every file whose stem is a substring of a text.
+
+    Rather than testing each stem against the text, the windows of the text with the length of some indexed
+    stem are looked up in a hash map, so a match costs the length of the text times the number of distinct
+    stem lengths. Matches are returned in the order of `paths`, as scanning the list would do.
+    """
+
+    def __init__(self, paths: list):
+        self.paths = list(paths)
+        self.stems = defaultdict(list)
+
+        for position, path in enumerate(self.paths):
+            self.stems[file_stem(path)].append(position)
+
+        self.lengths = sorted(set(len(stem) for stem in self.stems))
+
+    def match(self, text) -> list:
+        text = str(text)
+        positions = set()
+
+        for length in self.lengths:
+            if length > len(text):
+                break
+            for start in range(len(text) - length + 1):
+                positions.update(self.stems.get(text[start : start + length], ()))
+
+        return [self.paths[position] for position in sorted(positions)]
+
+
+# translation of the columns of the sampling workbooks
+COLUMNS = {
+    "CÓDIGO": "Code",
+    "DESCRIPCIÓN": "Description",
+    "COORDENADAS X": "X-Coordinates",
+    "COORDENADAS Y": "Y-Coordinates",
+    "ALTITUD": "Altitude",
+    "PENDIENTE": "Slope",
+    "GRAVAS": "Gravels",
+    "ARENAS MUY GRUESAS": "Very Coarse Sands",
+    "ARENAS GRUESAS": "Coarse Sands",
+    "ARENAS MEDIAS": "Medium Sands",
+    "ARENAS FINAS": "Fine Sands",
+    "ARENAS MUY FINAS": "Very Fine Sands",
+    "ARENAS TOTALES": "Total Sands",
+    "LIMOS GRUESOS": "Coarse Silts",
+    "LIMOS FINOS": "Fine Silts",
+    "LIMOS TOTALES": "Total Silts",
+    "ARCILLAS": "Clays",
+    "FACTOR K": "K Factor",
+    "DENSIDAD APARENTE": "Apparent Density",
+    "ESTABILIDAD DE AGREGADOS": "Aggregate Stability",
+    "PERMEABILIDAD": "Permeability",
+    "CAPACIDAD DE CAMPO": "Field Capacity",
+    "PUNTO DE MARCHITEZ PERMANENTE": "Permanent Wilting Point",
+    "HIDROFOBICIDAD": "Hydrofobicity",
+    "CARBONO ORGÁNICO": "Organic Carbon",
+    "FACTOR C": "C Factor",
+    "CONDUCTIVIDAD ELÉCTRICA": "Electric Conductivity",
+}
+
+
+def parse_workbook(excel_path, photo_index: StemIndex, spectre_index: StemIndex) -> pd.DataFrame:
+    """
+    Read the `EJEMPLO` sheet of a sampling workbook, translate its columns and link the photographs and
+    spectral responses of every sample.
+    """
+    excel_data_fragment = pd.read_excel(excel_path, sheet_name="EJEMPLO")
+    excel_data_fragment.rename(columns=COLUMNS, inplace=True)
+
+    column_photo_path = [photo_index.match(row_photo) or None for row_photo in excel_data_fragment["FOTOGRAFÍAS"]]
+    column_spectre_path = [
+        spectre_index.match(row_spectre) or None for row_spectre in excel_data_fragment["RESPUESTA ESPECTRAL"]
+    ]
+
+    excel_data_fragment["Pictures Path"] = column_photo_path
+    excel_data_fragment["Spectral Response Path"] = column_spectre_path
+
+    return excel_data_fragment.drop(columns=["FOTOGRAFÍAS", "RESPUESTA ESPECTRAL"])
+
+
+def read_table(path, delimiter: str = ";", **kwargs) -> pd.DataFrame:
+    """
+    Read a tabular dataset written as Parquet (`.parquet`) or as delimited text.
+    """
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path, **kwargs)
+    return pd.read_csv(path, sep=delimiter, **kwargs)
+
+
+def iter_table(path, delimiter: str = ";", chunksize: int = 10000):
+    """
+    Read a tabular dataset written as Parquet (`.parquet`) or as delimited text by blocks of `chunksize` rows.
+    """
+    if str(path).endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, sep=delimiter, chunksize=chunksize)
+
+
+def morton_order(x: np.ndarray, y: np.ndarray, bits: int = 16) -> np.ndarray:
+    """
+    Order of points along a Z-order (Morton) curve, so that points close in space are close in the order.
+
+    The coordinates are scaled to `bits` bits (16 at most) over their bounds and interleaved, points without
+    coordinates are placed last.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    present = ~(np.isnan(x) | np.isnan(y))
+    codes = np.full(len(x), np.iinfo(np.uint64).max, dtype=np.uint64)
+
+    def spread(values: np.ndarray) -> np.ndarray:
+        """
+        Scale the values to `bits` bits and insert a zero bit before each of their bits.
+        """
+        span = values.max() - values.min()
+        values = np.round((values - values.min()) / (span if span > 0 else 1) * ((1 << bits) - 1)).astype(np.uint64)
+        for shift, mask in [(8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)]:
+            values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+        return values
+
+    if present.any():
+        codes[present] = spread(x[present]) | (spread(y[present]) << np.uint64(1))
+
+    return np.argsort(codes, kind="stable")
+
+
+def row_group_bounds(path, x: str = "X-Coordinates", y: str = "Y-Coordinates") -> list:
+    """
+    Bounding box (`xmin`, `ymin`, `xmax`, `ymax`) of every row group of a Parquet file, from the statistics of
+    its coordinate columns.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    names = [metadata.schema.column(column).name for column in range(metadata.num_columns)]
+
+    bounds = []
+    for group in range(metadata.num_row_groups):
+        statistics = [metadata.row_group(group).column(names.index(name)).statistics for name in (x, y)]
+        if any(stats is None or not stats.has_min_max for stats in statistics):
+            bounds.append(None)
+        else:
+            bounds.append((statistics[0].min, statistics[1].min, statistics[0].max, statistics[1].max))
+
+    return bounds
+
+
+def read_table_bbox(path, bbox: tuple, x: str = "X-Coordinates", y: str = "Y-Coordinates") -> pd.DataFrame:
+    """
+    Read the rows of a Parquet file whose coordinates are inside `bbox` (`xmin`, `ymin`, `xmax`, `ymax`), only
+    reading the row groups whose bounding box intersects it.
+    """
+    xmin, ymin, xmax, ymax = bbox
+    groups = [
+        group
+        for group, bounds in enumerate(row_group_bounds(path, x, y))
+        if bounds is not None and bounds[0] <= xmax and bounds[2] >= xmin and bounds[1] <= ymax and bounds[3] >= ymin
+    ]
+
+    df = pq.ParquetFile(path).read_row_groups(groups).to_pandas()
+    return df[df[x].between(xmin, xmax) & df[y].between(ymin, ymax)].reset_index(drop=True)
+
+
+class RunningMoments:
+    """
+    Mean and variance of the columns of a dataset that is seen by blocks of rows.
+
+    The moments of every block are merged with those accumulated so far with the pairwise update of Chan et al.,
+    which unlike summing squares keeps its precision when the mean is large compared to the deviation.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        count = values.shape[0]
+        if count == 0:
+            return
+
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.m2 / self.count
+
+    @property
+    def scale(self) -> np.ndarray:
+        """
+        Standard deviation, 1 for the constant columns as in `StandardScaler`.
+        """
+        std = np.sqrt(self.variance)
+        return np.where(std == 0, 1.0, std)
+
+
+class CrossProducts:
+    """
+    Pearson correlation matrix of a dataset that is seen by blocks of rows, from sums of its cross-products.
+
+    The values are shifted by the means of the first block to keep the precision of the sums. With `pairwise`,
+    null values only exclude the pairs of factors they appear in, and every sum is kept for each pair of factors
+    over the rows where both of them are present.
+    """
+
+    def __init__(self, n_factors: int, dtype: str = "float64", pairwise: bool = False):
+        self.dtype = np.dtype(dtype)
+        self.pairwise = pairwise
+        self.shift = None
+
+        shape = (n_factors, n_factors)
+        self.count = np.zeros(shape if pairwise else (), dtype=np.int64)
+        self.sums = np.zeros(shape if pairwise else n_factors, dtype=self.dtype)
+        self.squares = np.zeros(shape if pairwise else n_factors, dtype=self.dtype)
+        self.products = np.zeros(shape, dtype=self.dtype)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=self.dtype)
+        if self.shift is None:
+            with np.errstate(all="ignore"):
+                self.shift = np.nan_to_num(np.nanmean(values, axis=0)).astype(self.dtype)
+
+        values = values - self.shift
+
+        if self.pairwise:
+            # sums of every factor over the rows where the other one of the pair is present
+            present = (~np.isnan(values)).astype(self.dtype)
+            values = np.nan_to_num(values)
+
+            self.count += (present.T @ present).astype(np.int64)
+            self.sums += values.T @ present
+            self.squares += (values ** 2).T @ present
+        else:
+            self.count += len(values)
+            self.sums += values.sum(axis=0)
+            self.squares += (values ** 2).sum(axis=0)
+
+        self.products += values.T @ values
+
+    def correlation(self) -> np.ndarray:
+        count = self.count.astype(np.float64)
+        sums = self.sums.astype(np.float64)
+        squares = self.squares.astype(np.float64)
+
+        if self.pairwise:
+            # sums[i, j] is the sum of the factor i over the rows where j is present
+            covariance = count * self.products - sums * sums.T
+            variance = (count * squares - sums ** 2) * (count * squares - sums ** 2).T
+        else:
+            covariance = count * self.products - np.outer(sums, sums)
+            variance = np.outer(count * squares - sums ** 2, count * squares - sums ** 2)
+
+        with np.errstate(all="ignore"):
+            correlation = covariance / np.sqrt(variance)
+
+        return np.clip(correlation, -1, 1)
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` rows of a dataset that is seen by blocks of rows.
+    """
+
+    def __init__(self, size: int, seed: int = None):
+        self.size = size
+        self.seen = 0
+        self.rows = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values)
+        if self.rows is None:
+            self.rows = np.empty((self.size,) + values.shape[1:], dtype=values.dtype)
+
+        # the first rows fill the reservoir, then the i-th row replaces a random one with probability size / i
+        free = max(0, min(self.size - self.seen, len(values)))
+        self.rows[self.seen : self.seen + free] = values[:free]
+
+        positions = self._rng.integers(0, np.arange(self.seen + free, self.seen + len(values)) + 1)
+        replaced = positions < self.size
+        self.rows[positions[replaced]] = values[free:][replaced]
+
+        self.seen += len(values)
+
+    @property
+    def sample(self) -> np.ndarray:
+        return self.rows[: min(self.size, self.seen)]
+
+
+def file_digest(path, chunk_size: int = 1 << 20) -> str:
+    """
+    SHA-256 of the content of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaUploader:
+    """
+    Upload files to remote storage from a bounded pool of threads.
+
+    Files are keyed by their SHA-256 and name, and a file whose key is already in `index` is not uploaded
+    again, its previous remote path is returned instead. `index` can be loaded from a previous run.
+    """
+
+    def __init__(self, storage, workers: int = 4, index: dict = None):
+        self.storage = storage
+        self.index = dict(index or {})
+        self.uploaded = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def submit(self, local_path, remove: bool = False) -> Future:
+        """
+        Schedule the upload of `local_path`, a path or a function that writes the file and returns its path, or
+        None when there is no file to upload.
+        """
+        return self._executor.submit(self._upload, local_path, remove)
+
+    def _upload(self, local_path, remove: bool) -> str:
+        if callable(local_path):
+            local_path = local_path()
+        if local_path is None:
+            return None
+
+        key = f"{file_digest(local_path)}/{Path(local_path).name}"
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key not in self.index:
+                self.index[key] = self.storage.put_file(local_path)
+                with self._lock:
+                    self.uploaded += 1
+
+        if remove:
+            Path(local_path).unlink()
+
+        return self.index[key]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -0,0 +1,120 @@
+from pathlib import Path
+
+import pandas as pd
+
+from drama.process import Process
+from drama.core.model import SimpleTabularDataset
+from drama.models.task import TaskResult
+from dataclasses import dataclass
+
+from drama_enbic2lab.catalog.water.utils import HOMOGENEITY_TESTS, checkpoint_key, checkpointed, homogeneity_tests
+
+
+@dataclass
+class SimpleTabularDatasetTest(SimpleTabularDataset):
+    pass
+
+
+def execute(
+    pcs: Process,
+    start_date: str,
+    end_date: str,
+    stations: list = None,
+    tests: list = ["pettit", "shnt", "buishand"],
+    alpha: float = 0.05,
+    sim: int = 10000,
+    seed: int = None,
+    resume: bool = True,
+):
+    """
+    Homogeneity tests of every station of a time series matrix
+    Args:
+        pcs (Process)
+    Parameters:
+        start_date (str): Time series starting date.
+        end_date (str): Time series ending date.
+        stations (list): Stations to test. Default to None (all the stations)
+        tests (list): Homogeneity tests to perform
+                    Values that can be included in the list are 'pettit','shnt','buishand'.
+        alpha (float): Significance level of the tests. Default to 0.05
+        sim (int): Number of Monte Carlo simulations for the p-values. Default to 10000
+        seed (int): Seed of the Monte Carlo simulations. Default to None
+        resume (bool): Reuse the results of the tests checkpointed in the local directory by a previous run
+                    with the same inputs and parameters. Default to True
+
+    Inputs:
+         TabularDataSet (Simple Dataset): Time series of the stations to test
+    Outputs:
+        TabularDataSet (SimpleTabularDatasetTest): Homogeneity tests by station
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_file = inputs["SimpleTabularDataset"][0]
+    input_file_resource = input_file["resource"]
+    input_file_delimiter = input_file["delimiter"]
+
+    local_file_path = pcs.storage.get_file(input_file_resource)
+
+    # checking errors
+    tests = ["shnt" if test == "snht" else test for test in tests]
+    if not tests or any(test not in HOMOGENEITY_TESTS for test in tests):
+        raise ValueError("Enter a valid homogeneity test")
+
+    # create dataframe
+    df = pd.read_csv(local_file_path, sep=input_file_delimiter)
+
+    # format to datetime
+    df["DATE"] = pd.to_datetime(df["DATE"], format="%Y-%m-%d")
+
+    filtered_df = df.loc[(df["DATE"] >= start_date) & (df["DATE"] <= end_date)].set_index("DATE")
+
+    if stations:
+        filtered_df = filtered_df[stations]
+
+    # stations without enough records to split the series are not tested
+    observed = filtered_df.notna().sum()
+    empty_stations = list(observed[observed < 3].index)
+    if empty_stations:
+        pcs.info([f"Stations without enough data to be tested: {empty_stations}"])
+
+    network = filtered_df.drop(columns=empty_stations).astype(float)
+
+    # the results of every test are checkpointed in the local directory under the fingerprint of the run
+    key = checkpoint_key(
+        local_file_path, start_date=start_date, end_date=end_date, stations=stations, alpha=alpha, sim=sim, seed=seed
+    )
+
+    # computing the homogeneity tests for all the stations at once
+    tests_df = pd.concat(
+        [
+            checkpointed(
+                pcs.storage.local_dir,
+                test,
+                key,
+                lambda: homogeneity_tests(network, test, alpha=alpha, sim=sim, seed=seed),
+                resume,
+            )
+            for test in tests
+        ],
+        axis=1,
+    )
+
+    # prepare output for the homegeneity tests
+    out_csv = Path(pcs.storage.local_dir, "NetworkHomogeneityTests.csv")
+    tests_df.to_csv(out_csv, sep=input_file_delimiter)
+
+    # send time to remote storage
+    dfs_dir_test = pcs.storage.put_file(out_csv)
+
+    # send to downstream
+    test_csv = SimpleTabularDatasetTest(resource=dfs_dir_test, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(test_csv)
+
+    return TaskResult(files=[dfs_dir_test])
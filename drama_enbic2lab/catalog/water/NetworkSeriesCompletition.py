@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from drama.process import Process
+from drama.core.model import SimpleTabularDataset
+from drama.models.task import TaskResult
+from dataclasses import dataclass
+
+from drama_enbic2lab.catalog.water.utils import iterative_svd_impute
+
+
+@dataclass
+class SimpleTabularDatasetSeries(SimpleTabularDataset):
+    pass
+
+
+def execute(
+    pcs: Process,
+    start_date: str,
+    end_date: str,
+    stations: list = None,
+    rank: int = 3,
+    tolerance: float = 1e-4,
+    max_iterations: int = 100,
+    non_negative: bool = False,
+    seed: int = None,
+):
+    """
+    Completition of every station of a time series matrix using an iterative low-rank SVD imputation
+    Args:
+        pcs (Process)
+    Parameters:
+        start_date (str): Time series starting date.
+        end_date (str): Time series ending date.
+        stations (list): Stations to complete together. Default to None (all the stations)
+        rank (int): Number of components of the low-rank reconstruction. Default to 3
+        tolerance (float): Relative change between iterations that stops the imputation. Default to 1e-4
+        max_iterations (int): Maximum number of iterations of the imputation. Default to 100
+        non_negative (bool): Clip the completed values at zero, as in precipitation series. Default to False
+        seed (int): Seed of the randomized SVD used for large networks. Default to None
+
+    Inputs:
+         TabularDataSet (Simple Dataset): Time series of the stations to complete
+    Outputs:
+        TabularDataSet (SimpleTabularDatasetSeries): Time series of every station completed
+        TabularDataSet (Simple Dataset): Observed, completed and reconstruction error by station
+
+    Produces:
+
+    Author:
+        Khaos Research
+    """
+
+    # read inputs
+    inputs = pcs.get_from_upstream()
+
+    input_file = inputs["SimpleTabularDataset"][0]
+    input_file_resource = input_file["resource"]
+    input_file_delimiter = input_file["delimiter"]
+
+    local_file_path = pcs.storage.get_file(input_file_resource)
+
+    # checking errors
+    if rank < 1:
+        raise ValueError("The rank of the imputation must be at least 1")
+
+    # create dataframe
+    df = pd.read_csv(local_file_path, sep=input_file_delimiter)
+
+    # format to datetime
+    df["DATE"] = pd.to_datetime(df["DATE"], format="%Y-%m-%d")
+
+    filtered_df = df.loc[(df["DATE"] >= start_date) & (df["DATE"] <= end_date)].set_index("DATE")
+
+    if stations:
+        filtered_df = filtered_df[stations]
+
+    # stations without at least two records can not be standardized
+    observed = filtered_df.notna().sum()
+    empty_stations = list(observed[observed < 2].index)
+    if empty_stations:
+        pcs.info([f"Stations without enough data to be completed: {empty_stations}"])
+
+    network = filtered_df.drop(columns=empty_stations).astype(float)
+
+    # low-rank imputation of the whole network
+    completed, reconstruction, iterations, converged = iterative_svd_impute(
+        network.values, rank=rank, tolerance=tolerance, max_iterations=max_iterations, seed=seed
+    )
+    pcs.info([f"Imputation finished after {iterations} iterations, converged: {converged}"])
+
+    if non_negative:
+        completed = np.clip(completed, 0, None)
+
+    completed_df = pd.DataFrame(completed, index=network.index, columns=network.columns).round(3)
+    completed_df = completed_df.join(filtered_df[empty_stations])[filtered_df.columns]
+
+    # dataframe to store the performance of the imputation for every station
+    residuals = np.where(network.isna(), np.nan, reconstruction - network.values)
+    analysis_df = pd.DataFrame(
+        index=["Observed data", "Completed data", "Reconstruction RMSE"],
+        columns=network.columns,
+    )
+    analysis_df.loc["Observed data"] = network.notna().sum()
+    analysis_df.loc["Completed data"] = network.isna().sum() - completed_df[network.columns].isna().sum()
+    analysis_df.loc["Reconstruction RMSE"] = np.sqrt(np.nanmean(residuals ** 2, axis=0))
+
+    # prepare output for the analysis of the imputation
+    out_csv = Path(pcs.storage.local_dir, "NetworkAnalysis.csv")
+    analysis_df.to_csv(out_csv, sep=input_file_delimiter)
+
+    # send time to remote storage
+    dfs_dir_analysis = pcs.storage.put_file(out_csv)
+
+    # send to downstream
+    analysis_csv = SimpleTabularDataset(resource=dfs_dir_analysis, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(analysis_csv)
+
+    # prepare output for the series completed
+    out_csv = Path(pcs.storage.local_dir, "NetworkCompleted.csv")
+    completed_df.to_csv(out_csv, sep=input_file_delimiter)
+
+    # send time to remote storage
+    dfs_dir_series = pcs.storage.put_file(out_csv)
+
+    # send to downstream
+    series_csv = SimpleTabularDatasetSeries(resource=dfs_dir_series, delimiter=input_file_delimiter, file_format=".csv")
+    pcs.to_downstream(series_csv)
+
+    return TaskResult(files=[dfs_dir_analysis, dfs_dir_series])
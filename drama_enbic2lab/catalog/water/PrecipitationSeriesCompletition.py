@@ -14,6 +14,8 @@ from drama.models.task import TaskResult
 from drama.core.model import SimpleTabularDataset
 from dataclasses import dataclass
 
+from drama_enbic2lab.catalog.water.utils import holdout_skill
+
 
 @dataclass
 class SimpleTabularDatasetSeries(SimpleTabularDataset):
@@ -25,6 +27,11 @@ class SimpleTabularDatasetTest(SimpleTabularDataset):
     pass
 
 
+@dataclass
+class SimpleTabularDatasetSkill(SimpleTabularDataset):
+    pass
+
+
 def execute(
     pcs: Process,
     start_date: str,
@@ -33,6 +40,11 @@ def execute(
     analysis_stations: list,
     priorize: str = "r2",
     tests: list = ["pettit", "shnt", "buishand"],
+    evaluate: bool = False,
+    holdout_fraction: float = 0.1,
+    holdout_trials: int = 100,
+    holdout_method: str = "random",
+    seed: int = None,
 ):
 
     """
@@ -48,6 +60,13 @@ def execute(
                     Values are 'r2','slope','pair'
         tests (list): Homogeneity tests to perform
                     Values that can be included in the list are 'pettit','snht','buishand'.
+        evaluate (bool): Evaluate the completion hiding known values of the target station and
+                    reconstructing them. Default to False
+        holdout_fraction (float): Fraction of the known target values hidden in each trial. Default to 0.1
+        holdout_trials (int): Number of hold-out trials. Default to 100
+        holdout_method (str): Way of hiding the target values
+                    Values are 'random','blocked'
+        seed (int): Seed of the hold-out trials. Default to None
 
     Inputs:
          TabularDataSet (Simple Dataset): Precipitation Time series to complete
@@ -55,6 +74,7 @@ def execute(
         TabularDataSet (Simple Dataset): Precipitation Time series completed
         TabularDataSet (SimpleTabularDatasetSeries): Linear regression fitting between stations
         TabularDataSet (SimpleTabularDatasetTest): Homogeneity Test for the completition
+        TabularDataSet (SimpleTabularDatasetSkill): Hold-out skill of the completition, only if `evaluate`
 
     Produces:
 
@@ -78,6 +98,9 @@ def execute(
     if "pettit" and "shnt" and "buishand" not in tests:
         raise ValueError("Enter a valid homogeneity test")
 
+    if holdout_method != "random" and holdout_method != "blocked":
+        raise ValueError("Enter a valid method to hide the values of the evaluation")
+
     # create dataframe
     df = pd.read_csv(local_file_path, sep=input_file_delimiter)
 
@@ -127,6 +150,19 @@ def execute(
 
     best_stations = list(analysis_df.columns)
 
+    # hold-out evaluation of the completition, dry days of the donors are filled with zero
+    if evaluate:
+        skill_df = holdout_skill(
+            filtered_df,
+            target_station,
+            best_stations,
+            fraction=holdout_fraction,
+            trials=holdout_trials,
+            method=holdout_method,
+            seed=seed,
+            zero_donor_fill=True,
+        )
+
     # dataframe to store the best completition
     target_completition = filtered_df[["DATE", target_station]]
     target_completition = target_completition.set_index("DATE")
@@ -222,4 +258,22 @@ def execute(
     test_csv = SimpleTabularDatasetTest(resource=dfs_dir_test, delimiter=input_file_delimiter, file_format=".csv")
     pcs.to_downstream(test_csv)
 
-    return TaskResult(files=[dfs_dir_analysis, dfs_dir_series, dfs_dir_test])
+    files = [dfs_dir_analysis, dfs_dir_series, dfs_dir_test]
+
+    if evaluate:
+        # prepare output for the hold-out evaluation
+        out_csv = Path(pcs.storage.local_dir, "CompletionSkill.csv")
+        skill_df.to_csv(out_csv, sep=input_file_delimiter)
+
+        # send time to remote storage
+        dfs_dir_skill = pcs.storage.put_file(out_csv)
+
+        # send to downstream
+        skill_csv = SimpleTabularDatasetSkill(
+            resource=dfs_dir_skill, delimiter=input_file_delimiter, file_format=".csv"
+        )
+        pcs.to_downstream(skill_csv)
+
+        files.append(dfs_dir_skill)
+
+    return TaskResult(files=files)
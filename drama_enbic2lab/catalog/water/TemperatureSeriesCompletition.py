@@ -14,6 +14,14 @@ from drama.core.model import SimpleTabularDataset
 from drama.models.task import TaskResult
 from dataclasses import dataclass
 
+from drama_enbic2lab.catalog.water.utils import (
+    checkpoint_key,
+    checkpointed,
+    daily_normals,
+    day_of_year_slot,
+    holdout_skill,
+)
+
 
 @dataclass
 class SimpleTabularDatasetSeries(SimpleTabularDataset):
@@ -25,6 +33,25 @@ class SimpleTabularDatasetTest(SimpleTabularDataset):
     pass
 
 
+@dataclass
+class SimpleTabularDatasetSkill(SimpleTabularDataset):
+    pass
+
+
+@dataclass
+class SimpleTabularDatasetNormals(SimpleTabularDataset):
+    pass
+
+
+def _homogeneity_test(test, x) -> list:
+    """
+    Run a homogeneity test of `pyhomogeneity` and return its results in a list that can be checkpointed.
+    """
+    homogeneity, change_point, p_value, statistic, mu = test(x, alpha=0.5, sim=10000)
+
+    return [homogeneity, change_point, p_value, statistic, str(mu)]
+
+
 def execute(
     pcs: Process,
     start_date: str,
@@ -33,6 +60,14 @@ def execute(
     analysis_stations: list,
     priorize: str = "r2",
     tests: list = ["pettit", "shnt", "buishand"],
+    evaluate: bool = False,
+    holdout_fraction: float = 0.1,
+    holdout_trials: int = 100,
+    holdout_method: str = "random",
+    seed: int = None,
+    anomalies: bool = False,
+    smoothing_window: int = 31,
+    resume: bool = True,
 ):
     """
     Completition of min and max temperature time series using a linear regression
@@ -47,14 +82,29 @@ def execute(
                     Values are 'r2','slope','pair'
         tests (list): Homogeneity tests to perform
                     Values that can be included in the list are 'pettit','snht','buishand'.
+        evaluate (bool): Evaluate the completion hiding known values of the target station and
+                    reconstructing them. Default to False
+        holdout_fraction (float): Fraction of the known target values hidden in each trial. Default to 0.1
+        holdout_trials (int): Number of hold-out trials. Default to 100
+        holdout_method (str): Way of hiding the target values
+                    Values are 'random','blocked'
+        seed (int): Seed of the hold-out trials. Default to None
+        anomalies (bool): Perform the regression and the completion on the anomalies from the daily
+                    normals of each station, adding the normals of the target back at the end. Default to False
+        smoothing_window (int): Days of the moving average that smooths the daily normals. Default to 31
+        resume (bool): Reuse the regression, completion and test results checkpointed in the local directory
+                    by a previous run with the same inputs and parameters. Default to True
 
     Inputs:
          TabularDataSet (Simple Dataset): Max Temperature time series to complete
          TabularDataSet (Simple Dataset): Min Temperature time series to complete
+         TabularDataSet (SimpleTabularDatasetNormals): Daily normals of a previous run, optional
     Outputs:
         TabularDataSet (SimpleTabularDatasetSeries): Precipitation Time series completed
         TabularDataSet (Simple Dataset): Linear regression fitting between stations
         TabularDataSet (SimpleTabularDatasetTest): Homogeneity Test for the completition
+        TabularDataSet (SimpleTabularDatasetSkill): Hold-out skill of the completition, only if `evaluate`
+        TabularDataSet (SimpleTabularDatasetNormals): Daily normals of the stations, only if `anomalies`
 
     Produces:
 
@@ -83,6 +133,9 @@ def execute(
     if "pettit" and "shnt" and "buishand" not in tests:
         raise ValueError("Enter a valid homogeneity test")
 
+    if holdout_method != "random" and holdout_method != "blocked":
+        raise ValueError("Enter a valid method to hide the values of the evaluation")
+
     # read datasets
     df_max = pd.read_csv(local_file_path_one, sep=input_file_delimiter_one)
     df_min = pd.read_csv(local_file_path_two, sep=input_file_delimiter_two)
@@ -94,6 +147,39 @@ def execute(
     # create list of dataframes to iterate
     df_list = [df_max, df_min]
 
+    # the finished steps are checkpointed in the local directory under the fingerprint of the run
+    checkpoint_files = [local_file_path_one, local_file_path_two]
+    if anomalies and "SimpleTabularDatasetNormals" in inputs:
+        checkpoint_files.append(pcs.storage.get_file(inputs["SimpleTabularDatasetNormals"][0]["resource"]))
+
+    key = checkpoint_key(
+        *checkpoint_files,
+        start_date=start_date,
+        end_date=end_date,
+        target_station=target_station,
+        analysis_stations=analysis_stations,
+        priorize=priorize,
+        anomalies=anomalies,
+        smoothing_window=smoothing_window,
+    )
+
+    # daily normals (366 days x station) of the maximum and minimum temperatures, the ones received from
+    # upstream are reused and only the missing stations are computed from the whole record
+    if anomalies:
+        if "SimpleTabularDatasetNormals" in inputs:
+            input_file_normals = inputs["SimpleTabularDatasetNormals"][0]
+            local_file_path_normals = pcs.storage.get_file(input_file_normals["resource"])
+            normals_df = pd.read_csv(local_file_path_normals, sep=input_file_normals["delimiter"], index_col=0)
+        else:
+            normals_df = pd.DataFrame(index=pd.RangeIndex(1, 367, name="DAY"))
+
+        for df, t in zip(df_list, ["(MAX)", "(MIN)"]):
+            missing_stations = [
+                station for station in [target_station] + analysis_stations if station + t not in normals_df.columns
+            ]
+            if missing_stations:
+                normals_df = normals_df.join(daily_normals(df, missing_stations, smoothing_window).add_suffix(t))
+
     # create date range from the starting to the ending date
     dates_pd = pd.date_range(start=start_date, end=end_date, freq="D")
 
@@ -102,6 +188,9 @@ def execute(
     out_df["DATE"] = dates_pd
     out_df = out_df.set_index("DATE")
 
+    # dataframe for the hold-out evaluation of both temperatures
+    skill_df = pd.DataFrame()
+
     # set the starting temperature to the maximum temperature
     temp = "(MAX)"
 
@@ -111,73 +200,114 @@ def execute(
         # filter the data by the desired dates
         filtered_df = df.loc[(df["DATE"] >= start_date) & (df["DATE"] <= end_date)]
 
-        # dataframe to store the regression performance between the stations
-        analysis_df = pd.DataFrame(
-            index=["R2", "Slope", "Intercept", "Pair of data"],
-            columns=analysis_stations,
+        # remove the seasonal cycle of every station
+        if anomalies:
+            filtered_df = filtered_df.copy()
+            slots = day_of_year_slot(filtered_df["DATE"])
+            for station in [target_station] + analysis_stations:
+                filtered_df[station] = filtered_df[station] - normals_df[station + temp].values[slots]
+
+        # linear regressions and completion of the target station, checkpointed once finished
+        def complete():
+            # dataframe to store the regression performance between the stations
+            analysis_df = pd.DataFrame(
+                index=["R2", "Slope", "Intercept", "Pair of data"],
+                columns=analysis_stations,
+            )
+
+            # dataframe with the all the completitions
+            series_completition = pd.DataFrame(columns=["DATE"])
+            series_completition["DATE"] = filtered_df["DATE"]
+            series_completition = series_completition.set_index("DATE")
+
+            # Linear regression between the stations
+            for station in analysis_stations:
+                join_df = filtered_df[[target_station, station]]
+                shared_data = len(join_df.dropna())
+                join_df = join_df.dropna()
+                X = join_df[station].values.reshape(-1, 1)
+                y = join_df[target_station].values.reshape(-1, 1)
+
+                # if the analysis station is have no data, remove it from the analysis
+                if len(X) == 0:
+                    analysis_df = analysis_df.drop(station, axis=1)
+                    pass
+
+                # performing the linear regression and storing the completition and the performance
+                else:
+                    regr = LinearRegression()
+                    regr.fit(X, y)
+
+                    # We store the different coefficient of regression between the target station
+                    # and the stations that will be used to complete the series
+                    analysis_df.loc["R2", station] = regr.score(X, y)
+                    analysis_df.loc["Slope", station] = regr.coef_[0][0]
+                    analysis_df.loc["Intercept", station] = regr.intercept_[0]
+                    analysis_df.loc["Pair of data", station] = shared_data
+
+                    # Then, we take the values of each station
+                    completition = filtered_df[["DATE", station]].dropna()
+                    completition = completition.set_index("DATE")
+                    station_fit = completition[station].values.reshape(-1, 1)
+                    station_pred = regr.predict(station_fit)
+                    completition[station] = station_pred
+                    series_completition = series_completition.join(completition)
+
+            # sort stations according to the priorization criterion
+            if priorize == "r2":
+                analysis_df = analysis_df.sort_values("R2", axis=1, ascending=False)
+            elif priorize == "slope":
+                analysis_df = analysis_df.sort_values("Slope", axis=1, ascending=False)
+            elif priorize == "pairs":
+                analysis_df = analysis_df.sort_values("Pair of Data", axis=1, ascending=False)
+
+            best_stations = list(analysis_df.columns)
+
+            # dataframe to store the best completition
+            target_completition = filtered_df[["DATE", target_station]]
+            target_completition = target_completition.set_index("DATE")
+
+            # completing the target station until now more empty values remain
+            rows_to_complete = target_completition[target_station].isna().sum().tolist()
+
+            while rows_to_complete != 0:
+                for station in best_stations:
+                    target_completition.loc[
+                        target_completition[target_station].isna(), target_station
+                    ] = series_completition.loc[target_completition[target_station].isna(), station].values
+                    rows_to_complete = target_completition[target_station].isna().sum().tolist()
+
+            # add the seasonal cycle of the target station back
+            if anomalies:
+                target_completition[target_station] += normals_df[target_station + temp].values[slots]
+
+            return analysis_df, target_completition
+
+        analysis_df, target_completition = checkpointed(
+            pcs.storage.local_dir, "completion" + temp, key, complete, resume
         )
-
-        # dataframe with the all the completitions
-        series_completition = pd.DataFrame(columns=["DATE"])
-        series_completition["DATE"] = filtered_df["DATE"]
-        series_completition = series_completition.set_index("DATE")
-
-        # Linear regression between the stations
-        for station in analysis_stations:
-            join_df = filtered_df[[target_station, station]]
-            shared_data = len(join_df.dropna())
-            join_df = join_df.dropna()
-            X = join_df[station].values.reshape(-1, 1)
-            y = join_df[target_station].values.reshape(-1, 1)
-
-            # if the analysis station is have no data, remove it from the analysis
-            if len(X) == 0:
-                analysis_df = analysis_df.drop(station, axis=1)
-                pass
-
-            # performing the linear regression and storing the completition and the performance
-            else:
-                regr = LinearRegression()
-                regr.fit(X, y)
-
-                # We store the different coefficient of regression between the target station
-                # and the stations that will be used to complete the series
-                analysis_df.loc["R2", station] = regr.score(X, y)
-                analysis_df.loc["Slope", station] = regr.coef_[0][0]
-                analysis_df.loc["Intercept", station] = regr.intercept_[0]
-                analysis_df.loc["Pair of data", station] = shared_data
-
-                # Then, we take the values of each station
-                completition = filtered_df[["DATE", station]].dropna()
-                completition = completition.set_index("DATE")
-                station_fit = completition[station].values.reshape(-1, 1)
-                station_pred = regr.predict(station_fit)
-                completition[station] = station_pred
-                series_completition = series_completition.join(completition)
-
-        # sort stations according to the priorization criterion
-        if priorize == "r2":
-            analysis_df = analysis_df.sort_values("R2", axis=1, ascending=False)
-        elif priorize == "slope":
-            analysis_df = analysis_df.sort_values("Slope", axis=1, ascending=False)
-        elif priorize == "pairs":
-            analysis_df = analysis_df.sort_values("Pair of Data", axis=1, ascending=False)
-
         best_stations = list(analysis_df.columns)
 
-        # dataframe to store the best completition
-        target_completition = filtered_df[["DATE", target_station]]
-        target_completition = target_completition.set_index("DATE")
-
-        # completing the target station until now more empty values remain
-        rows_to_complete = target_completition[target_station].isna().sum().tolist()
-
-        while rows_to_complete != 0:
-            for station in best_stations:
-                target_completition.loc[
-                    target_completition[target_station].isna(), target_station
-                ] = series_completition.loc[target_completition[target_station].isna(), station].values
-                rows_to_complete = target_completition[target_station].isna().sum().tolist()
+        # hold-out evaluation of the completition
+        if evaluate:
+            temp_skill_df = checkpointed(
+                pcs.storage.local_dir,
+                "skill" + temp,
+                checkpoint_key(
+                    key=key, fraction=holdout_fraction, trials=holdout_trials, method=holdout_method, seed=seed
+                ),
+                lambda: holdout_skill(
+                    filtered_df,
+                    target_station,
+                    best_stations,
+                    fraction=holdout_fraction,
+                    trials=holdout_trials,
+                    method=holdout_method,
+                    seed=seed,
+                ),
+                resume,
+            )
+            skill_df = pd.concat([skill_df, temp_skill_df.add_suffix(temp)], axis=1)
 
         # updating the output dataframe
         out_df[target_station + temp] = target_completition[target_station]
@@ -213,7 +343,13 @@ def execute(
         to_test = out_df.loc[:, column]
 
         if "pettit" in tests:
-            [homogeneity, change_point, p_value, U, mu] = pyhomogeneity.pettitt_test(to_test, alpha=0.5, sim=10000)
+            [homogeneity, change_point, p_value, U, mu] = checkpointed(
+                pcs.storage.local_dir,
+                "pettit" + t,
+                key,
+                lambda: _homogeneity_test(pyhomogeneity.pettitt_test, to_test),
+                resume,
+            )
             tests_df.loc["Homogeneity", "Pettit Test" + t] = homogeneity
             tests_df.loc["Change Point Location", "Pettit Test" + t] = change_point
             tests_df.loc["P-value", "Pettit Test" + t] = p_value
@@ -221,20 +357,26 @@ def execute(
             tests_df.loc["Average between change point", "Pettit Test" + t] = mu
 
         if "shnt" in tests:
-            [homogeneity, change_point, p_value, T, mu] = pyhomogeneity.snht_test(to_test, alpha=0.5, sim=10000)
+            [homogeneity, change_point, p_value, T, mu] = checkpointed(
+                pcs.storage.local_dir,
+                "shnt" + t,
+                key,
+                lambda: _homogeneity_test(pyhomogeneity.snht_test, to_test),
+                resume,
+            )
             tests_df.loc["Homogeneity", "SNHT Test" + t] = homogeneity
             tests_df.loc["Change Point Location", "SNHT Test" + t] = change_point
             tests_df.loc["P-value", "SNHT Test" + t] = p_value
             tests_df.loc["Maximum test Statistics", "SNHT Test" + t] = T
             tests_df.loc["Average between change point", "SNHT Test" + t] = mu
         if "buishand" in tests:
-            [
-                homogeneity,
-                change_point,
-                p_value,
-                R,
-                mu,
-            ] = pyhomogeneity.buishand_range_test(to_test, alpha=0.5, sim=10000)
+            [homogeneity, change_point, p_value, R, mu] = checkpointed(
+                pcs.storage.local_dir,
+                "buishand" + t,
+                key,
+                lambda: _homogeneity_test(pyhomogeneity.buishand_range_test, to_test),
+                resume,
+            )
             tests_df.loc["Homogeneity", "Buishand Test" + t] = homogeneity
             tests_df.loc["Change Point Location", "Buishand Test" + t] = change_point
             tests_df.loc["P-value", "Buishand Test" + t] = p_value
@@ -280,4 +422,38 @@ def execute(
     test_csv = SimpleTabularDatasetTest(resource=dfs_dir_test, delimiter=input_file_delimiter_one, file_format=".csv")
     pcs.to_downstream(test_csv)
 
-    return TaskResult(files=[dfs_dir_analysis, dfs_dir_series, dfs_dir_test])
+    files = [dfs_dir_analysis, dfs_dir_series, dfs_dir_test]
+
+    if evaluate:
+        # prepare output for the hold-out evaluation
+        out_csv = Path(pcs.storage.local_dir, "CompletionSkill.csv")
+        skill_df.to_csv(out_csv, sep=input_file_delimiter_one)
+
+        # send time to remote storage
+        dfs_dir_skill = pcs.storage.put_file(out_csv)
+
+        # send to downstream
+        skill_csv = SimpleTabularDatasetSkill(
+            resource=dfs_dir_skill, delimiter=input_file_delimiter_one, file_format=".csv"
+        )
+        pcs.to_downstream(skill_csv)
+
+        files.append(dfs_dir_skill)
+
+    if anomalies:
+        # prepare output for the daily normals
+        out_csv = Path(pcs.storage.local_dir, "DailyNormals.csv")
+        normals_df.to_csv(out_csv, sep=input_file_delimiter_one)
+
+        # send time to remote storage
+        dfs_dir_normals = pcs.storage.put_file(out_csv)
+
+        # send to downstream
+        normals_csv = SimpleTabularDatasetNormals(
+            resource=dfs_dir_normals, delimiter=input_file_delimiter_one, file_format=".csv"
+        )
+        pcs.to_downstream(normals_csv)
+
+        files.append(dfs_dir_normals)
+
+    return TaskResult(files=files)
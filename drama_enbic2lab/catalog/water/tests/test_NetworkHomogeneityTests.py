@@ -0,0 +1,85 @@
+import shutil
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pyhomogeneity
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.water.NetworkHomogeneityTests import execute
+from drama_enbic2lab.catalog.water.utils import homogeneity_tests
+from drama_enbic2lab.catalog.water.tests import RESOURCES
+
+
+class NetworkHomogeneityTestsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_NetworkHomogeneityTests"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # copy file to task dir
+        dataset = shutil.copy(Path(RESOURCES, "PrecipitationTimeSeries.csv"), storage.local_dir)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(
+            return_value={"SimpleTabularDataset": [{"resource": dataset, "delimiter": ";"}]}
+        )
+
+    def test_integration(self):
+        # execute func
+        data = execute(pcs=self.pcs, start_date="1974-10-01", end_date="2018-09-30", sim=200, seed=1)
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "NetworkHomogeneityTests.csv").is_file())
+
+        # read the output file to assert that the output is valid
+        tests_df = pd.read_csv(Path(self.pcs.storage.local_dir, "NetworkHomogeneityTests.csv"), sep=";", index_col=0)
+
+        self.assertListEqual(["JABUGO", "GALAROZA", "CORTEGANA", "ARACENA", "ALAJAR"], list(tests_df.index))
+        self.assertEqual(15, len(tests_df.columns))
+
+        # the statistics match the ones of pyhomogeneity station by station
+        input_df = pd.read_csv(Path(RESOURCES, "PrecipitationTimeSeries.csv"), sep=";", index_col=0, parse_dates=True)
+        input_df = input_df.loc["1974-10-01":"2018-09-30"]
+
+        for station in tests_df.index:
+            _, change_point, _, U, _ = pyhomogeneity.pettitt_test(input_df[station], sim=None)
+            self.assertEqual(change_point, tests_df.loc[station, "Pettit Test(Change Point Location)"])
+            self.assertAlmostEqual(U, tests_df.loc[station, "Pettit Test(Maximum test Statistics)"])
+
+            _, change_point, _, T, _ = pyhomogeneity.snht_test(input_df[station], sim=None)
+            self.assertEqual(change_point, tests_df.loc[station, "SNHT Test(Change Point Location)"])
+            self.assertAlmostEqual(T, tests_df.loc[station, "SNHT Test(Maximum test Statistics)"])
+
+            _, change_point, _, R, _ = pyhomogeneity.buishand_range_test(input_df[station], sim=None)
+            self.assertEqual(change_point, tests_df.loc[station, "Buishand Test(Change Point Location)"])
+            self.assertAlmostEqual(R, tests_df.loc[station, "Buishand Test(Maximum test Statistics)"])
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+        # a restarted run reuses the checkpointed tests and only computes the missing ones
+        checkpoints = sorted(Path(self.pcs.storage.local_dir, "checkpoints").glob("*.pkl"))
+        self.assertEqual(3, len(checkpoints))
+        checkpoints[0].unlink()
+
+        with patch(
+            "drama_enbic2lab.catalog.water.NetworkHomogeneityTests.homogeneity_tests", wraps=homogeneity_tests
+        ) as tests_mock:
+            execute(pcs=self.pcs, start_date="1974-10-01", end_date="2018-09-30", sim=200, seed=1)
+            self.assertEqual(1, tests_mock.call_count)
+
+        resumed_df = pd.read_csv(Path(self.pcs.storage.local_dir, "NetworkHomogeneityTests.csv"), sep=";", index_col=0)
+        pd.testing.assert_frame_equal(tests_df, resumed_df)
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
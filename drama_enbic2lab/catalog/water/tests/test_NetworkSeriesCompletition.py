@@ -0,0 +1,70 @@
+import shutil
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from drama.storage import LocalStorage
+from drama.models.task import TaskResult
+
+from drama_enbic2lab.catalog.water.NetworkSeriesCompletition import execute
+from drama_enbic2lab.catalog.water.tests import RESOURCES
+
+
+class NetworkSeriesCompletitionTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        task_id, task_name = "tests", "test_NetworkSeriesCompletition"
+
+        storage = LocalStorage(bucket_name=task_id, folder_name=task_name)
+        storage.setup()
+
+        # copy file to task dir
+        dataset = shutil.copy(Path(RESOURCES, "PrecipitationTimeSeries.csv"), storage.local_dir)
+
+        # mock process
+        self.pcs = MagicMock(storage=storage)
+        self.pcs.get_from_upstream = MagicMock(
+            return_value={"SimpleTabularDataset": [{"resource": dataset, "delimiter": ";"}]}
+        )
+
+    def test_integration(self):
+        # execute func
+        data = execute(
+            pcs=self.pcs,
+            start_date="1974-10-01",
+            end_date="2018-09-30",
+            rank=2,
+            non_negative=True,
+            seed=1,
+        )
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "NetworkAnalysis.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "NetworkCompleted.csv").is_file())
+
+        # read the output files to assert that the output is valid
+        analysis_df = pd.read_csv(Path(self.pcs.storage.local_dir, "NetworkAnalysis.csv"), sep=";", index_col=0)
+        completed_df = pd.read_csv(Path(self.pcs.storage.local_dir, "NetworkCompleted.csv"), sep=";", index_col=0)
+        input_df = pd.read_csv(Path(RESOURCES, "PrecipitationTimeSeries.csv"), sep=";", index_col=0)
+        input_df = input_df.loc["1974-10-01":"2018-09-30"]
+
+        self.assertListEqual(["JABUGO", "GALAROZA", "CORTEGANA", "ARACENA", "ALAJAR"], list(completed_df.columns))
+        self.assertListEqual(["Observed data", "Completed data", "Reconstruction RMSE"], list(analysis_df.index))
+        self.assertEqual(len(input_df), len(completed_df))
+
+        # observed values are kept and every date with some record is completed
+        observed = input_df.notna()
+        pd.testing.assert_frame_equal(input_df[observed], completed_df[observed], check_dtype=False, atol=1e-3)
+        self.assertEqual(0, completed_df[observed.any(axis=1)].isna().sum().sum())
+        self.assertTrue((completed_df.fillna(0) >= 0).all().all())
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+
+    def tearDown(self) -> None:
+        self.pcs.storage.remove_local_dir()
+
+
+if __name__ == "__main__":
+    unittest.main()
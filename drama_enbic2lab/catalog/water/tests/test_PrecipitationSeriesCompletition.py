@@ -2,6 +2,7 @@ import shutil
 import unittest
 import datetime
 import openpyxl
+import pandas as pd
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -119,6 +120,36 @@ Average between change point;mean(mu1=2.523104968782518, mu2=2.7167806274603366)
         # assert output data is valid
         self.assertIs(type(data), TaskResult)
 
+    def test_evaluation(self):
+        # execute func with the hold-out evaluation
+        data = execute(
+            pcs=self.pcs,
+            start_date="1974-10-01",
+            end_date="2018-09-30",
+            target_station="GALAROZA",
+            analysis_stations=["JABUGO", "CORTEGANA", "ARACENA", "ALAJAR"],
+            priorize="r2",
+            evaluate=True,
+            holdout_trials=20,
+            seed=1,
+        )
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "CompletionSkill.csv").is_file())
+
+        # read the output file to assert that the output is valid
+        skill_df = pd.read_csv(Path(self.pcs.storage.local_dir, "CompletionSkill.csv"), sep=";", index_col=0)
+
+        self.assertListEqual(["RMSE", "Bias", "R2", "Held-out data"], list(skill_df.index))
+        self.assertListEqual(["CORTEGANA", "JABUGO", "ALAJAR", "ARACENA", "Overall"], list(skill_df.columns))
+        self.assertTrue((skill_df.loc["RMSE"] > 0).all())
+        self.assertTrue((skill_df.loc["R2"] < 1).all())
+        self.assertTrue((skill_df.loc["Held-out data"] > 0).all())
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+        self.assertEqual(4, len(data.files))
+
     def tearDown(self) -> None:
         self.pcs.storage.remove_local_dir()
 
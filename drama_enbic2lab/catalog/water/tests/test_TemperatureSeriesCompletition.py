@@ -2,6 +2,7 @@ import shutil
 import unittest
 import datetime
 import openpyxl
+import pandas as pd
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -118,6 +119,103 @@ Average between change point;mean(mu1=12.185567010309278, mu2=19.245011086474502
         # assert output data is valid
         self.assertIs(type(data), TaskResult)
 
+    def test_evaluation(self):
+        # execute func with the hold-out evaluation
+        target = "QUESADA (FUENTE DEL PINO)"
+        analysis = ["POZO ALCON (PRADOS DE CUENCA)", "POZO ALCON (EL HORNICO)"]
+
+        data = execute(
+            pcs=self.pcs,
+            start_date="1918-10-01",
+            end_date="1921-09-30",
+            target_station=target,
+            analysis_stations=analysis,
+            priorize="r2",
+            evaluate=True,
+            holdout_method="blocked",
+            seed=1,
+        )
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "CompletionSkill.csv").is_file())
+
+        # read the output file to assert that the output is valid
+        skill_df = pd.read_csv(Path(self.pcs.storage.local_dir, "CompletionSkill.csv"), sep=";", index_col=0)
+
+        self.assertListEqual(["RMSE", "Bias", "R2", "Held-out data"], list(skill_df.index))
+        self.assertListEqual(
+            [
+                "POZO ALCON (PRADOS DE CUENCA)(MAX)",
+                "POZO ALCON (EL HORNICO)(MAX)",
+                "Overall(MAX)",
+                "POZO ALCON (PRADOS DE CUENCA)(MIN)",
+                "POZO ALCON (EL HORNICO)(MIN)",
+                "Overall(MIN)",
+            ],
+            list(skill_df.columns),
+        )
+        self.assertTrue((skill_df.loc["RMSE"] > 0).all())
+        self.assertTrue((skill_df.loc["Held-out data"] > 0).all())
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+        self.assertEqual(4, len(data.files))
+
+    def test_anomalies(self):
+        # execute func on the anomalies from the daily normals
+        target = "QUESADA (FUENTE DEL PINO)"
+        analysis = ["POZO ALCON (PRADOS DE CUENCA)", "POZO ALCON (EL HORNICO)"]
+
+        data = execute(
+            pcs=self.pcs,
+            start_date="1918-10-01",
+            end_date="1921-09-30",
+            target_station=target,
+            analysis_stations=analysis,
+            priorize="r2",
+            anomalies=True,
+        )
+
+        # assert output files exists
+        self.assertTrue(Path(self.pcs.storage.local_dir, "DailyNormals.csv").is_file())
+        self.assertTrue(Path(self.pcs.storage.local_dir, "QUESADA (FUENTE DEL PINO)_completed.csv").is_file())
+
+        # read the output files to assert that the output is valid
+        normals_df = pd.read_csv(Path(self.pcs.storage.local_dir, "DailyNormals.csv"), sep=";", index_col=0)
+        series_df = pd.read_csv(
+            Path(self.pcs.storage.local_dir, "QUESADA (FUENTE DEL PINO)_completed.csv"), sep=";", index_col=0
+        )
+
+        self.assertEqual((366, 6), normals_df.shape)
+        self.assertEqual(0, normals_df.isna().sum().sum())
+        self.assertEqual(0, series_df.isna().sum().sum())
+
+        # assert output data is valid
+        self.assertIs(type(data), TaskResult)
+        self.assertEqual(4, len(data.files))
+
+        # the normals of the previous run are reused
+        normals_path = shutil.copy(
+            Path(self.pcs.storage.local_dir, "DailyNormals.csv"), Path(self.pcs.storage.local_dir, "Normals.csv")
+        )
+        inputs = self.pcs.get_from_upstream()
+        inputs["SimpleTabularDatasetNormals"] = [{"resource": normals_path, "delimiter": ";"}]
+        self.pcs.get_from_upstream = MagicMock(return_value=inputs)
+
+        execute(
+            pcs=self.pcs,
+            start_date="1918-10-01",
+            end_date="1921-09-30",
+            target_station=target,
+            analysis_stations=analysis,
+            priorize="r2",
+            anomalies=True,
+            smoothing_window=7,
+        )
+
+        reused_df = pd.read_csv(Path(self.pcs.storage.local_dir, "DailyNormals.csv"), sep=";", index_col=0)
+        pd.testing.assert_frame_equal(normals_df, reused_df)
+
     def tearDown(self) -> None:
         self.pcs.storage.remove_local_dir()
 
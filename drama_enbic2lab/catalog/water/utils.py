@@ -0,0 +1,447 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+from sklearn.utils.extmath import randomized_svd
+
+
+def _holdout_masks(known: np.ndarray, n_rows: int, fraction: float, trials: int, method: str, seed: int = None):
+    """
+    Build a (trials x rows) boolean matrix marking the known target values hidden in each trial.
+    """
+    n_holdout = max(1, int(round(fraction * len(known))))
+    rng = np.random.default_rng(seed)
+
+    if method == "random":
+        picks = np.argsort(rng.random((trials, len(known))), axis=1)[:, :n_holdout]
+    elif method == "blocked":
+        starts = rng.integers(0, len(known) - n_holdout + 1, size=trials)
+        picks = starts[:, None] + np.arange(n_holdout)
+    else:
+        raise ValueError("Enter a valid hold-out method, values are 'random' and 'blocked'")
+
+    held = np.zeros((trials, n_rows), dtype=bool)
+    held[np.arange(trials)[:, None], known[picks]] = True
+
+    return held
+
+
+def holdout_skill(
+    df: pd.DataFrame,
+    target_station: str,
+    ranked_stations: list,
+    fraction: float = 0.1,
+    trials: int = 100,
+    method: str = "random",
+    seed: int = None,
+    zero_donor_fill: bool = False,
+) -> pd.DataFrame:
+    """
+    Evaluate the regression completion of `target_station` by hiding known values and reconstructing them.
+
+    Every trial hides a `fraction` of the known target values (scattered at random or as one contiguous
+    block), refits the target-donor regressions on the remaining pairs and fills the hidden values, both
+    with each donor alone and with the donor ranking used by the completion. All the trials are solved at
+    once: the least squares fits and the error sums are matrix products between the (trials x dates)
+    hold-out masks and the (donors x dates) series.
+
+    Args:
+        df (pd.DataFrame): Series of the target and the donor stations, one column per station.
+        target_station (str): Station whose known values are hidden.
+        ranked_stations (list): Donor stations, ordered by their completion priority.
+        fraction (float): Fraction of the known target values hidden in each trial.
+        trials (int): Number of hold-out trials.
+        method (str): 'random' to hide scattered values, 'blocked' to hide a contiguous run of values.
+        seed (int): Seed of the random generator.
+        zero_donor_fill (bool): Fill with zero when the donor value is zero (dry day in precipitation).
+
+    Returns:
+        pd.DataFrame: RMSE, bias, R2 and number of held-out data for every donor and for the ranked completion.
+    """
+    if not 0 < fraction < 1:
+        raise ValueError("The hold-out fraction must be between 0 and 1")
+
+    y = df[target_station].to_numpy(dtype=float)
+    X = df[ranked_stations].to_numpy(dtype=float).T
+
+    known = np.flatnonzero(~np.isnan(y))
+    if len(known) < 2:
+        raise ValueError(f"Not enough known values in {target_station} to evaluate the completion")
+
+    held = _holdout_masks(known, len(y), fraction, trials, method, seed)
+
+    valid = ~np.isnan(X)
+    dry = valid & (X == 0) if zero_donor_fill else np.zeros_like(valid)
+    wet = valid & ~dry
+
+    x0 = np.where(valid, X, 0.0)
+    y0 = np.where(np.isnan(y), 0.0, y)
+
+    # least squares fit of every donor in every trial from the masked sums
+    train = (~held & ~np.isnan(y)).astype(float)
+    v = valid.astype(float)
+    n = train @ v.T
+    sx = train @ x0.T
+    sy = train @ (v * y0).T
+    sxx = train @ (x0 ** 2).T
+    sxy = train @ (x0 * y0).T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+        intercept = (sy - slope * sx) / n
+    fitted = np.isfinite(slope) & np.isfinite(intercept)
+    slope = np.where(fitted, slope, 0.0)
+    intercept = np.where(fitted, intercept, 0.0)
+
+    # errors of every donor on the held-out values, expanded as sums of the hidden data
+    test = held.astype(float)
+    w = wet.astype(float)
+    d = dry.astype(float)
+    m = test @ w.T
+    tx = test @ (w * x0).T
+    txx = test @ (w * x0 ** 2).T
+    ty = test @ (w * y0).T
+    tyy = test @ (w * y0 ** 2).T
+    txy = test @ (w * x0 * y0).T
+
+    sse = (
+        slope ** 2 * txx + 2 * slope * intercept * tx - 2 * slope * txy + intercept ** 2 * m - 2 * intercept * ty + tyy
+    )
+    err = slope * tx + intercept * m - ty
+
+    # dry donor values are filled with zero whatever the regression
+    ty_dry = test @ (d * y0).T
+    tyy_dry = test @ (d * y0 ** 2).T
+    m = m + test @ d.T
+    sse = sse + tyy_dry
+    err = err - ty_dry
+    ty = ty + ty_dry
+    tyy = tyy + tyy_dry
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sst = np.where(m > 0, tyy - ty ** 2 / m, 0.0)
+
+    sse, err, sst, m = (np.where(fitted, a, 0.0) for a in (sse, err, sst, m))
+
+    skill = pd.DataFrame(index=["RMSE", "Bias", "R2", "Held-out data"], columns=ranked_stations + ["Overall"])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        skill.loc["RMSE", ranked_stations] = np.sqrt(sse.sum(axis=0) / m.sum(axis=0))
+        skill.loc["Bias", ranked_stations] = err.sum(axis=0) / m.sum(axis=0)
+        skill.loc["R2", ranked_stations] = 1 - sse.sum(axis=0) / sst.sum(axis=0)
+    skill.loc["Held-out data", ranked_stations] = m.sum(axis=0).astype(int)
+
+    # ranked completion, every hidden value is filled by the first donor with data on that date
+    covered = valid.any(axis=0)
+    first = valid.argmax(axis=0)
+    columns = np.arange(len(y))
+    prediction = slope[:, first] * x0[first, columns] + intercept[:, first]
+    prediction = np.where(dry[first, columns], 0.0, prediction)
+
+    scored = held & covered & fitted[:, first]
+    error = np.where(scored, prediction - y0, 0.0)
+    observed = np.where(scored, y0, 0.0)
+    count = scored.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sst = np.where(count > 0, (observed ** 2).sum(axis=1) - observed.sum(axis=1) ** 2 / count, 0.0)
+        skill.loc["RMSE", "Overall"] = np.sqrt((error ** 2).sum() / count.sum())
+        skill.loc["Bias", "Overall"] = error.sum() / count.sum()
+        skill.loc["R2", "Overall"] = 1 - (error ** 2).sum() / sst.sum()
+    skill.loc["Held-out data", "Overall"] = int(count.sum())
+
+    return skill
+
+
+def iterative_svd_impute(
+    matrix: np.ndarray,
+    rank: int = 3,
+    tolerance: float = 1e-4,
+    max_iterations: int = 100,
+    seed: int = None,
+) -> tuple:
+    """
+    Fill the missing values of a (dates x stations) matrix with an iterative low-rank SVD reconstruction.
+
+    The stations are standardized with their observed mean and standard deviation and the gaps start at
+    the station mean. Each iteration replaces the gaps with the rank `rank` reconstruction of the whole
+    matrix until the relative change of the matrix falls below `tolerance`. Dates without any observation
+    are left empty.
+
+    Args:
+        matrix (np.ndarray): Station series, one column per station, with NaN in the gaps.
+        rank (int): Number of singular vectors kept in the reconstruction.
+        tolerance (float): Relative change of the matrix between iterations that stops the imputation.
+        max_iterations (int): Maximum number of iterations.
+        seed (int): Seed of the randomized SVD.
+
+    Returns:
+        tuple: Completed matrix, low-rank reconstruction of the matrix, number of iterations and
+            whether the imputation converged.
+    """
+    missing = np.isnan(matrix)
+    mean = np.nanmean(matrix, axis=0)
+    std = np.nanstd(matrix, axis=0)
+    std[~(std > 0)] = 1.0
+
+    z = np.where(missing, 0.0, (matrix - mean) / std)
+    rank = min(rank, min(z.shape))
+
+    # full SVD for small matrices, randomized SVD when only a few components of a large one are needed
+    truncated = rank < min(z.shape) // 2
+
+    converged = False
+    iteration = 0
+    reconstruction = z
+    while iteration < max_iterations and not converged:
+        iteration += 1
+
+        if truncated:
+            u, s, vt = randomized_svd(z, n_components=rank, random_state=seed)
+        else:
+            u, s, vt = np.linalg.svd(z, full_matrices=False)
+            u, s, vt = u[:, :rank], s[:rank], vt[:rank]
+        reconstruction = (u * s) @ vt
+
+        change = np.sum((reconstruction[missing] - z[missing]) ** 2) / max(np.sum(z ** 2), np.finfo(float).tiny)
+        z[missing] = reconstruction[missing]
+        converged = change < tolerance
+
+    completed = z * std + mean
+    completed[np.isnan(matrix).all(axis=1)] = np.nan
+
+    return completed, reconstruction * std + mean, iteration, converged
+
+
+def day_of_year_slot(dates: pd.Series) -> np.ndarray:
+    """
+    Position of every date in a 366-day year, so that the same calendar day takes the same slot in
+    leap and non-leap years (29 February is slot 59).
+    """
+    dates = pd.DatetimeIndex(dates)
+    shift = (~dates.is_leap_year) & (dates.month > 2)
+
+    return np.asarray(dates.dayofyear - 1 + shift)
+
+
+def daily_normals(df: pd.DataFrame, stations: list, window: int = 31) -> pd.DataFrame:
+    """
+    Smoothed day-of-year climatology of every station.
+
+    The mean of every calendar day is smoothed with a centered circular moving average of `window` days,
+    weighting each day by its number of records, so that the end of the year is smoothed with its start.
+
+    Args:
+        df (pd.DataFrame): Time series with a `DATE` column and one column per station.
+        stations (list): Stations to compute.
+        window (int): Days of the moving average.
+
+    Returns:
+        pd.DataFrame: 366 x stations normals, indexed by the day of the year.
+    """
+    if window < 1:
+        raise ValueError("The smoothing window must be at least one day")
+
+    slots = day_of_year_slot(df["DATE"])
+    values = df[stations].to_numpy(dtype=float)
+    known = ~np.isnan(values)
+
+    # sum and number of records of every calendar day
+    sums = np.zeros((366, len(stations)))
+    counts = np.zeros((366, len(stations)))
+    np.add.at(sums, slots, np.where(known, values, 0.0))
+    np.add.at(counts, slots, known)
+
+    # circular moving sums from the cumulative sums of the wrapped year
+    half = min(window // 2, 182)
+    padded_sums = np.vstack([np.zeros((1, len(stations))), np.pad(sums, ((half, half), (0, 0)), mode="wrap")])
+    padded_counts = np.vstack([np.zeros((1, len(stations))), np.pad(counts, ((half, half), (0, 0)), mode="wrap")])
+    padded_sums = padded_sums.cumsum(axis=0)
+    padded_counts = padded_counts.cumsum(axis=0)
+
+    width = 2 * half + 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normals = (padded_sums[width:] - padded_sums[:-width]) / (padded_counts[width:] - padded_counts[:-width])
+
+    normals_df = pd.DataFrame(normals, index=pd.RangeIndex(1, 367, name="DAY"), columns=stations)
+
+    return normals_df.interpolate(limit_direction="both")
+
+
+def _pettitt(x: np.ndarray, n: np.ndarray) -> tuple:
+    """
+    Pettitt U statistic of every column of `x`, whose first `n` values are the records of the column.
+    """
+    k = np.arange(1, x.shape[0] + 1)[:, None]
+    ranks = rankdata(np.where(np.isnan(x), np.inf, x), axis=0)
+
+    u = np.abs(2 * ranks.cumsum(axis=0) - k * (n + 1))
+    u = np.where(k < n, u, -np.inf)
+
+    return u.max(axis=0), u.argmax(axis=0) + 1
+
+
+def _snht(x: np.ndarray, n: np.ndarray) -> tuple:
+    """
+    Standard normal homogeneity test T statistic of every column of `x`.
+    """
+    k = np.arange(1, x.shape[0] + 1)[:, None]
+    x0 = np.where(np.isnan(x), 0.0, x)
+    mean = x0.sum(axis=0) / n
+    std = np.sqrt(np.where(k <= n, (x0 - mean) ** 2, 0.0).sum(axis=0) / (n - 1))
+
+    s = x0.cumsum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z1 = (s - k * mean) / std / k
+        z2 = ((s[-1] - s) - (n - k) * mean) / std / (n - k)
+        t = k * z1 ** 2 + (n - k) * z2 ** 2
+    t = np.where(k < n, t, -np.inf)
+
+    return t.max(axis=0), t.argmax(axis=0) + 1
+
+
+def _buishand(x: np.ndarray, n: np.ndarray) -> tuple:
+    """
+    Buishand range R statistic of every column of `x`.
+    """
+    k = np.arange(1, x.shape[0] + 1)[:, None]
+    x0 = np.where(np.isnan(x), 0.0, x)
+    mean = x0.sum(axis=0) / n
+    std = np.sqrt(np.where(k <= n, (x0 - mean) ** 2, 0.0).sum(axis=0) / n)
+
+    s = x0.cumsum(axis=0) - k * mean
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_std = s / std
+    r = (np.where(k <= n, s_std, -np.inf).max(axis=0) - np.where(k <= n, s_std, np.inf).min(axis=0)) / np.sqrt(n)
+
+    return r, np.where(k <= n, np.abs(s), -np.inf).argmax(axis=0) + 1
+
+
+# name and statistic of the homogeneity tests, keyed as in the `tests` parameters of the components
+HOMOGENEITY_TESTS = {
+    "pettit": ("Pettit Test", _pettitt),
+    "shnt": ("SNHT Test", _snht),
+    "buishand": ("Buishand Test", _buishand),
+}
+
+
+def _monte_carlo_p_value(statistic, stats: np.ndarray, n: np.ndarray, sim: int, rng) -> np.ndarray:
+    """
+    Share of `sim` standard normal series of the same length whose statistic exceeds the one of each column.
+    The simulated series of every length are generated and tested in blocks as the columns of a matrix.
+    """
+    p_value = np.full(len(stats), np.nan)
+
+    for length in np.unique(n):
+        columns = np.flatnonzero(n == length)
+        block = max(1, 4_000_000 // length)
+        exceed = np.zeros(len(columns))
+        done = 0
+        while done < sim:
+            size = min(block, sim - done)
+            simulated, _ = statistic(rng.standard_normal((length, size)), np.full(size, length))
+            exceed += (simulated[:, None] > stats[columns][None, :]).sum(axis=0)
+            done += size
+        p_value[columns] = exceed / sim
+
+    return p_value
+
+
+def homogeneity_tests(df: pd.DataFrame, test: str, alpha: float = 0.05, sim: int = 10000, seed: int = None):
+    """
+    Run a homogeneity test over every station of a time series matrix at once.
+
+    The records of every station are packed at the top of its column, so the cumulative sums and the
+    statistics of all the stations are computed as operations on the whole matrix. The p-values are
+    estimated by Monte Carlo as in `pyhomogeneity`; with `sim` set to 0 only the Pettitt test has a p-value,
+    from its asymptotic approximation.
+
+    Args:
+        df (pd.DataFrame): Time series indexed by date, one column per station.
+        test (str): Homogeneity test, one of `HOMOGENEITY_TESTS`.
+        alpha (float): Significance level.
+        sim (int): Number of Monte Carlo simulations of the p-value.
+        seed (int): Seed of the Monte Carlo simulations.
+
+    Returns:
+        pd.DataFrame: Homogeneity, change point location, p-value, maximum test statistic and averages
+            before and after the change point of every station.
+    """
+    name, statistic = HOMOGENEITY_TESTS[test]
+
+    values = df.to_numpy(dtype=float)
+    order = np.argsort(np.isnan(values), axis=0, kind="stable")
+    x = np.take_along_axis(values, order, axis=0)
+    n = (~np.isnan(values)).sum(axis=0)
+
+    stats, location = statistic(x, n)
+
+    if sim:
+        p_value = _monte_carlo_p_value(statistic, stats, n, sim, np.random.default_rng(seed))
+    elif test == "pettit":
+        p_value = 2 * np.exp(-6 * stats ** 2 / (n.astype(float) ** 3 + n.astype(float) ** 2))
+    else:
+        p_value = np.full(len(stats), np.nan)
+
+    # averages before and after the change point
+    x0 = np.where(np.isnan(x), 0.0, x).cumsum(axis=0)
+    columns = np.arange(x.shape[1])
+    before = x0[location - 1, columns]
+    mu1 = before / location
+    mu2 = (x0[-1] - before) / (n - location)
+
+    dates = np.asarray(df.index)[order[location - 1, columns]]
+    if isinstance(df.index, pd.DatetimeIndex):
+        dates = pd.DatetimeIndex(dates).date.astype("str")
+
+    tests_df = pd.DataFrame(index=df.columns)
+    tests_df[name + "(Homogeneity)"] = alpha > p_value
+    tests_df[name + "(Change Point Location)"] = dates
+    tests_df[name + "(P-value)"] = p_value
+    tests_df[name + "(Maximum test Statistics)"] = stats
+    tests_df[name + "(Average between change point)"] = [
+        f"mean(mu1={float(a)!r}, mu2={float(b)!r})" for a, b in zip(mu1, mu2)
+    ]
+
+    return tests_df
+
+
+def checkpoint_key(*files, **params) -> str:
+    """
+    Fingerprint of the content of the input `files` and the `params` of a run, used to name its checkpoints.
+    """
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, "rb") as fin:
+            for block in iter(lambda: fin.read(1 << 20), b""):
+                digest.update(block)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+
+    return digest.hexdigest()[:16]
+
+
+def checkpointed(directory: str, name: str, key: str, compute, resume: bool = True):
+    """
+    Return the result of `compute()`, stored in `directory` as soon as it finishes.
+
+    With `resume`, a result stored by a previous run with the same `key` is loaded instead of computing it
+    again, so a restarted task only redoes the unfinished work.
+    """
+    path = Path(directory, "checkpoints", f"{name}-{key}.pkl")
+
+    if resume and path.is_file():
+        return pd.read_pickle(path)
+
+    result = compute()
+
+    # write to a temporary file first so that an interrupted write is never taken as finished
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_suffix(".partial")
+    pd.to_pickle(result, partial_path)
+    os.replace(partial_path, path)
+
+    return result
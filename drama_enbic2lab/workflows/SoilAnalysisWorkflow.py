@@ -0,0 +1,33 @@
+from drama.manager import TaskManager
+from drama.models.task import TaskRequest
+from drama.models.workflow import WorkflowRequest
+from drama.worker import execute
+
+
+task_load = TaskRequest(
+    name="LOADSPSS",
+    module="drama.core.catalog.load.ImportFile",
+    params={"url": "http://192.168.213.3:9000/soil/ExampleData.sav"},
+    inputs={},
+)
+
+task_soil_analysis = TaskRequest(
+    name="SOILANALYSIS",
+    module="drama_enbic2lab.catalog.soil.SoilAnalysis",
+    params={
+        "drop_index": True,
+        "variance_explained": 75,
+        "whiten": True,
+        "number_components": 0,
+        "persist_intermediates": False,
+    },
+    inputs={"TempFile": "LOADSPSS.TempFile"},
+)
+
+workflow_request = WorkflowRequest(tasks=[task_load, task_soil_analysis])
+
+workflow = execute(workflow_request)
+print(workflow)
+
+# gets results
+print(TaskManager().find({"parent": workflow.id}))
@@ -34,6 +34,8 @@ install_requires = [
     "scipy==1.6.0",
     "numpy==1.20.0rc2",
     "pyreadstat==1.0.8",
+    "pyarrow==3.0.0",
+    "Pillow",
     "pyhomogeneity==1.1",
 ]
 